@@ -61,7 +61,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # file test database, so mapper worker threads share it
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
+    },
+    # second target of mapper multi-database loads
+    'secondary': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_secondary.sqlite3'),
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db_secondary.sqlite3'),
+        },
+    },
 }
 
 # Internationalization
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mapper.utils.daemon import ImportDaemon
+
+
+class Command(BaseCommand):
+    help = 'Resident loader: run jobs of spool directory or Unix socket ' \
+           'with compiled schemas, related instances and database ' \
+           'connections kept warm between jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spool', default=None,
+                            help='directory of <name>.job files')
+        parser.add_argument('--socket', default=None,
+                            help='path of Unix socket')
+        parser.add_argument('--jobs', type=int, default=2,
+                            help='jobs run concurrently')
+        parser.add_argument('--backend', default=None,
+                            help='backend of jobs without "backend"')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='seconds between spool scans')
+        parser.add_argument('--cache-size', type=int, default=100000,
+                            help='cached related instances by model field')
+
+    def handle(self, *args, **options):
+        if not options['spool'] and not options['socket']:
+            raise CommandError('--spool or --socket required')
+        if options['jobs'] < 1:
+            raise CommandError('--jobs must be positive')
+
+        daemon = ImportDaemon(max_jobs=options['jobs'],
+                              spool=options['spool'],
+                              socket_path=options['socket'],
+                              interval=options['interval'],
+                              backend=options['backend'],
+                              cache_size=options['cache_size'],
+                              log=self.stdout.write)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('stopped')
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from mapper.utils import load_backend
+
+
+class Command(BaseCommand):
+    help = 'Load source file by mapping schema. With --shards file split ' \
+           'by records of --query, every shard can be loaded separately.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_name', help='full path of source file')
+        parser.add_argument('schema',
+                            help='dotted path to mapping schema dict')
+        parser.add_argument('--backend', default=None)
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--query', default=None,
+                            help='record query of shard index, '
+                                 'for example channel.events.event')
+        parser.add_argument('--shards', type=int, default=None,
+                            help='number of shards')
+        parser.add_argument('--shard', type=int, default=None,
+                            help='number of shard to load, '
+                                 'all shards one by one if missing')
+        parser.add_argument('--bulk-session', action='store_true',
+                            default=False,
+                            help='fast, not durable database settings '
+                                 'during load')
+        parser.add_argument('--preview', type=int, default=None,
+                            help='print first N mapped records of every '
+                                 'model without writes')
+        parser.add_argument('--sample', action='store_true', default=False,
+                            help='preview random sample over whole file')
+        parser.add_argument('--index-only', action='store_true',
+                            default=False,
+                            help='build shard index and print shards')
+
+    def handle(self, *args, **options):
+        try:
+            schema = import_string(options['schema'])
+        except ImportError as e:
+            raise CommandError(e)
+
+        backend = load_backend(options['backend'])
+        file_name = options['file_name']
+
+        if options['preview']:
+            preview = backend.preview(file_name, schema,
+                                      limit=options['preview'],
+                                      sample=options['sample'])
+            for label, records in sorted(preview.items()):
+                for record in records:
+                    self.stdout.write(u'{}: {}'.format(label, record))
+            return
+
+        if not options['shards']:
+            backend.load(file_name, schema, workers=options['workers'],
+                         bulk_session=options['bulk_session'])
+            return
+
+        if not options['query']:
+            raise CommandError('--query required for --shards')
+        if not hasattr(backend, 'load_shard'):
+            raise CommandError('backend not support sharding')
+
+        shards = backend.get_shards(file_name, options['query'],
+                                    options['shards'])
+        if options['index_only']:
+            for shard in shards:
+                self.stdout.write('{0.number}: bytes {0.start}-{0.end}, '
+                                  '{0.count} records'.format(shard))
+            return
+
+        if options['shard'] is not None:
+            if not 0 <= options['shard'] < len(shards):
+                raise CommandError('--shard must be in range 0..{}'
+                                   .format(len(shards) - 1))
+            shards = [shards[options['shard']]]
+
+        for shard in shards:
+            try:
+                backend.load_shard(file_name, schema, shard,
+                                   options['query'],
+                                   workers=options['workers'],
+                                   bulk_session=options['bulk_session'])
+            except ValueError as e:
+                raise CommandError(e)
+            self.stdout.write('shard {0.number}: {0.count} records loaded'
+                              .format(shard))
@@ -1,4 +1,4 @@
-from tests.utils import is_test_env
+from .utils import is_test_environment
 
-if is_test_env():
+if is_test_environment():
     from tests.models import *
\ No newline at end of file
@@ -1 +1,20 @@
 DEFAULT_MAPPING_BACKEND = 'xml'
+
+# mapped records kept in memory during load, bytes of pickled data,
+# rest spilled to temporary sqlite file
+SPILL_MEMORY = 64 * 1024 * 1024
+
+# bounds of write chunk size, initial size is backend `chunk_size`
+CHUNK_SIZE_BOUNDS = (100, 10000)
+# seconds, slower chunks shrink, long transactions hold locks
+CHUNK_LATENCY = 2.0
+# parameters of one query by database vendor
+MAX_QUERY_PARAMS = {'sqlite': 999}
+
+# fast write settings of bulk load session by database vendor,
+# durability traded for speed, originals restored after load
+BULK_SESSION = {
+    'sqlite': (('journal_mode', 'MEMORY'), ('synchronous', 'OFF'),
+               ('cache_size', -64 * 1024)),
+    'postgresql': (('synchronous_commit', 'off'), ),
+}
@@ -0,0 +1,101 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db.models.signals import pre_save, post_save, m2m_changed
+from django.dispatch import Signal
+
+
+CREATED = 'created'
+UPDATED = 'updated'
+LINKED = 'linked'
+
+# sent once per chunk and model in bulk signals mode of mapper load
+bulk_changed = Signal(providing_args=['pks', 'operation', 'using'])
+
+_state = threading.local()
+
+
+class BulkChanges(object):
+    """
+    Primary keys of changed instances grouped by model, operation
+    and database
+    """
+
+    def __init__(self):
+        self.changes = defaultdict(list)
+
+    def add(self, model, pk, operation, using):
+        self.changes[model, operation, using].append(pk)
+
+    def send(self):
+        changes, self.changes = self.changes, defaultdict(list)
+        for (model, operation, using), pks in changes.items():
+            bulk_changed.send(sender=model, pks=pks, operation=operation,
+                              using=using)
+
+
+def record_change(model, pk, operation, using=None):
+    """
+    Register change in collector of current thread, if any
+    """
+    changes = getattr(_state, 'changes', None)
+    if changes is not None:
+        changes.add(model, pk, operation, using)
+
+
+def send_changes():
+    changes = getattr(_state, 'changes', None)
+    if changes is not None:
+        changes.send()
+
+
+@contextmanager
+def collect_changes():
+    """
+    Collect changes of current thread, rest of them sent on exit
+    """
+    previous = getattr(_state, 'changes', None)
+    _state.changes = BulkChanges()
+    try:
+        yield _state.changes
+    finally:
+        _state.changes.send()
+        _state.changes = previous
+
+
+def gate_signal(signal):
+    """
+    Make signal skip delivery in threads which suppress it. Receivers
+    stay connected, so other threads get signal as usual.
+    """
+    with signal.lock:
+        if getattr(signal, 'gated', False):
+            return
+        for name in ('send', 'send_robust'):
+            setattr(signal, name, _gated(signal, getattr(signal, name)))
+        signal.gated = True
+
+
+def _gated(signal, send):
+    def gated_send(sender, **named):
+        if signal in getattr(_state, 'suppressed', ()):
+            return []
+        return send(sender, **named)
+    return gated_send
+
+
+@contextmanager
+def suppress_signals(signals=(pre_save, post_save, m2m_changed)):
+    """
+    Skip receivers of signals sent by current thread while active
+    """
+    for signal in signals:
+        gate_signal(signal)
+
+    previous = getattr(_state, 'suppressed', frozenset())
+    _state.suppressed = previous | frozenset(signals)
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
@@ -1 +1,7 @@
-from test_xml import XmlMapperTestSuite
+from test_xml import XmlMapperTestSuite, XmlQueryBudgetTest, XmlSchedulerTest, \
+    XmlShardTest, XmlMultiDatabaseTest, XmlDedupeTest, XmlReconcileTest, \
+    XmlBulkSignalsTest, XmlExportTest, XmlDaemonTest, XmlBulkSessionTest, \
+    XmlPreviewTest
+from test_csv import CsvMapperTestSuite
+from test_utils import BackendRegistryTest, DeduplicatorTest, ReconcileTest, \
+    SpillStoreTest, ChunkControllerTest, IOBoundHookTest
@@ -0,0 +1,152 @@
+# coding: utf-8
+"""
+Throughput and memory measurements of mapper on synthetic feeds.
+Not collected by test discovery, run explicitly:
+
+    MAPPER_BENCHMARK_RECORDS=1000000 \
+        python manage.py test mapper.tests.benchmarks
+
+`MAPPER_BENCHMARK_RECORDS` - records mapped without database access,
+`MAPPER_BENCHMARK_LOAD_RECORDS` - records loaded to database
+and exported back.
+"""
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from django.test import TransactionTestCase
+
+from .utils import generate_events_feed
+from ..utils import load_backend
+from ..tests.models import Event
+
+
+MAPPING_RECORDS = int(os.environ.get('MAPPER_BENCHMARK_RECORDS', 100000))
+LOAD_RECORDS = int(os.environ.get('MAPPER_BENCHMARK_LOAD_RECORDS', 2000))
+
+
+def max_rss():
+    """
+    Peak resident memory of process in megabytes
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return usage / 1024.0 / 1024.0
+    return usage / 1024.0
+
+
+class Measure(object):
+
+    def __init__(self, name, records):
+        self.name = name
+        self.records = records
+
+    def __enter__(self):
+        self.started = time.time()
+        self.rss = max_rss()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            return
+        elapsed = time.time() - self.started
+        sys.stderr.write(
+            '\n{name}: {records} records, {elapsed:.2f}s, '
+            '{rate:.0f} records/s, peak rss {rss:.1f}MB (+{delta:.1f}MB)'
+            .format(name=self.name, records=self.records, elapsed=elapsed,
+                    rate=self.records / (elapsed or 1e-9),
+                    rss=max_rss(), delta=max_rss() - self.rss)
+        )
+
+
+class XmlMapperBenchmark(TransactionTestCase):
+    schema = {
+        'mapper.Event': {
+            'query': 'channel.events.event',
+            'fields': {
+                'title': 'title',
+                'organizer': {
+                    'query': 'organizer',
+                    'model': 'mapper.Organizer',
+                    'field': 'title',
+                },
+            },
+            'rels': {
+                'places': {
+                    'query': 'place',
+                    'model': 'mapper.Place',
+                    'field': 'title',
+                    'through': 'mapper.EventDate',
+                    'left_field': 'event',
+                    'right_field': 'place',
+                    'fields': {
+                        'date': {
+                            'query': 'date',
+                            'hook': 'date'
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+    def setUp(self):
+        self.backend = load_backend('xml')
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def feed(self, count):
+        return generate_events_feed(
+            os.path.join(self.directory, 'feed_{}.rss'.format(count)), count
+        )
+
+    def test_mapping(self):
+        file_name = self.feed(MAPPING_RECORDS)
+
+        with Measure('mapping', MAPPING_RECORDS):
+            source = self.backend.load_source(file_name)
+            parsers = self.backend.load_parsers(self.schema)
+            records = self.backend.dispatch_records(source, parsers)
+            mapped = []
+            for parser in parsers:
+                for raw_data in records[parser]:
+                    mapped.append(parser.get_item_values(raw_data))
+                    for field in parser.fields_m2m:
+                        mapped.append((field.get_value(raw_data),
+                                       field.get_through_values(raw_data)))
+
+    def test_load(self):
+        file_name = self.feed(LOAD_RECORDS)
+
+        with Measure('load', LOAD_RECORDS):
+            report = self.backend.load(file_name, self.schema)
+
+        for label, methods in sorted(report.items()):
+            for method, chunks in sorted(methods.items()):
+                sys.stderr.write('\n{} {}: chunk sizes {}'.format(
+                    label, method, chunks['sizes']
+                ))
+
+        self.assertEqual(Event.objects.count(), LOAD_RECORDS)
+
+    def test_load_bulk_session(self):
+        file_name = self.feed(LOAD_RECORDS)
+
+        with Measure('load bulk session', LOAD_RECORDS):
+            self.backend.load(file_name, self.schema, bulk_session=True)
+
+        self.assertEqual(Event.objects.count(), LOAD_RECORDS)
+
+    def test_export(self):
+        self.backend.load(self.feed(LOAD_RECORDS), self.schema)
+
+        for backend in ('xml', 'json'):
+            file_name = os.path.join(self.directory,
+                                     'export.{}'.format(backend))
+            with Measure('export {}'.format(backend), LOAD_RECORDS):
+                load_backend(backend).export(file_name, self.schema)
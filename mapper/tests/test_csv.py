@@ -0,0 +1,111 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from .utils import load_source_abs_path
+from ..utils import load_backend
+from ..utils.csv import CsvMapperBackend, TsvMapperBackend
+from ..tests.models import Event, Place, EventDate, Organizer
+
+
+class CsvMapperTestSuite(TestCase):
+    source_file = 'source/events.csv'
+    schema = {
+        'mapper.Event': {
+            'fields': {
+                'title': 'title',
+                'organizer': {
+                    'query': 'organizer',
+                    'model': 'mapper.Organizer',
+                    'field': 'title',
+                },
+            },
+            'rels': {
+                'places': {
+                    'query': 'place',
+                    'model': 'mapper.Place',
+                    'field': 'title',
+                    'through': 'mapper.EventDate',
+                    'left_field': 'event',
+                    'right_field': 'place',
+                    'fields': {
+                        'date': {
+                            'query': 1,
+                            'hook': 'date'
+                        }
+                    }
+                }
+            }
+        }
+    }
+    backend = 'csv'
+
+    def setUp(self):
+        self.backend = load_backend(self.backend, cached=False)
+
+    def test_load_backend(self):
+        self.assertIsInstance(self.backend, CsvMapperBackend)
+        self.assertIsInstance(load_backend('tsv'), TsvMapperBackend)
+
+    def test_load_source(self):
+        source = self.backend.load_source(
+            load_source_abs_path(self.source_file)
+        )
+        self.assertEqual(source.header,
+                         ('title', 'date', 'place', 'organizer'))
+        self.assertEqual(len(list(source)), 2)
+
+    def test_load(self):
+        self.backend.load(load_source_abs_path(self.source_file),
+                          self.schema)
+
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(Place.objects.count(), 2)
+        self.assertEqual(Organizer.objects.count(), 1)
+        self.assertEqual(EventDate.objects.count(), 2)
+        self.assertEqual(
+            EventDate.objects.filter(date__isnull=False).count(), 2
+        )
+
+    def test_preview(self):
+        preview = self.backend.preview(
+            load_source_abs_path(self.source_file), self.schema, limit=1
+        )
+        event, = preview['mapper.Event']
+        self.assertEqual(event['related'], {'organizer': None})
+        self.assertIsNone(event['rels']['places']['target'])
+        self.assertEqual(Event.objects.count(), 0)
+
+    def test_load_chunked(self):
+        self.backend.chunk_size = 1
+        self.backend.chunk_bounds = (1, 1)
+        self.backend.spill_memory = 64
+        self.backend.load(load_source_abs_path(self.source_file),
+                          self.schema)
+
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(EventDate.objects.count(), 2)
+
+    def test_load_tsv(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(directory, 'events.tsv')
+            with open(file_name, 'w') as source:
+                source.write('title\torganizer\n'
+                             'event\torganizer 1\n'
+                             'event 1\torganizer 2\n')
+            schema = {'mapper.Event': {'fields': {
+                'title': 0,
+                'organizer': {'query': 'organizer',
+                              'model': 'mapper.Organizer',
+                              'field': 'title'}
+            }}}
+            load_backend('tsv', cached=False).load(file_name, schema)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(Organizer.objects.count(), 2)
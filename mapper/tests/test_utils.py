@@ -0,0 +1,253 @@
+# coding: utf-8
+import copy
+import os
+import threading
+import time
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from ..utils import load_backend, register_backend, BACKENDS
+from ..utils import reconcile
+from ..utils.chunks import ChunkController
+from ..utils.hooks import IOBoundHook, LRUCache
+from ..utils.dedupe import BloomFilter, RecordDeduplicator
+from ..utils.spill import external_sort, SpillStore
+from ..utils.xml import XmlMapperBackend
+
+
+class BackendRegistryTest(SimpleTestCase):
+
+    def test_load_backend_cached(self):
+        backend = load_backend('xml')
+        self.assertIsInstance(backend, XmlMapperBackend)
+        self.assertIs(load_backend('xml'), backend)
+        self.assertIsNot(load_backend('xml', cached=False), backend)
+
+    def test_load_backend_not_found(self):
+        self.assertRaises(ValueError, load_backend, 'unknown')
+
+    @override_settings(MAPPER_BACKENDS={
+        'custom': 'mapper.utils.xml.XmlMapperBackend'
+    })
+    def test_settings_backend(self):
+        self.assertIsInstance(load_backend('custom'), XmlMapperBackend)
+
+    def test_register_backend(self):
+        register_backend('registered', 'mapper.utils.xml.XmlMapperBackend')
+        try:
+            self.assertIsInstance(load_backend('registered'),
+                                  XmlMapperBackend)
+        finally:
+            BACKENDS.pop('registered')
+
+    def test_parsers_cached(self):
+        backend = load_backend('xml', cached=False)
+        schema = {'mapper.Owner': {'query': 'owner',
+                                   'fields': {'title': 'title'}}}
+        self.assertIs(backend.load_parsers(schema),
+                      backend.load_parsers(dict(schema)))
+
+    def test_parsers_cached_schema_unchanged(self):
+        backend = load_backend('xml', cached=False)
+        schema = {'mapper.Event': {
+            'query': 'channel.events.event',
+            'fields': {'title': 'title',
+                       'organizer': {'query': 'organizer', 'hook': 'capfirst',
+                                     'model': 'mapper.Organizer',
+                                     'field': 'title'}}
+        }}
+        expected = copy.deepcopy(schema)
+        parsers = backend.load_parsers(schema)
+        self.assertEqual(schema, expected)
+        self.assertIs(backend.load_parsers(schema), parsers)
+
+    def test_parsers_cache_size(self):
+        backend = load_backend('xml', cached=False)
+        backend.parsers_cache_size = 2
+        schemas = [{'mapper.Owner': {'query': query,
+                                     'fields': {'title': 'title'}}}
+                   for query in ('first', 'second', 'third')]
+        first = backend.load_parsers(schemas[0])
+        for schema in schemas[1:]:
+            backend.load_parsers(schema)
+
+        self.assertEqual(len(backend.parsers_cache), 2)
+        self.assertIsNot(backend.load_parsers(schemas[0]), first)
+
+
+class DeduplicatorTest(SimpleTestCase):
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.01)
+        digests = [RecordDeduplicator.get_digest((number, ))
+                   for number in range(1000)]
+        for digest in digests:
+            bloom.add(digest)
+
+        for digest in digests:
+            self.assertIn(digest, bloom)
+
+        false_positives = sum(
+            RecordDeduplicator.get_digest(('other', number)) in bloom
+            for number in range(1000)
+        )
+        self.assertLess(false_positives, 50)
+
+    def test_exact(self):
+        deduplicator = RecordDeduplicator(exact_limit=10)
+        self.assertEqual(deduplicator.check(('a', )), deduplicator.NEW)
+        self.assertEqual(deduplicator.check(('b', )), deduplicator.NEW)
+        self.assertEqual(deduplicator.check(('a', )),
+                         deduplicator.DUPLICATE)
+        self.assertEqual(deduplicator.duplicates, 1)
+
+    def test_switch_to_bloom(self):
+        deduplicator = RecordDeduplicator(exact_limit=2, capacity=100,
+                                          error_rate=0.01)
+        for key in 'abc':
+            self.assertEqual(deduplicator.check((key, )), deduplicator.NEW)
+
+        self.assertIsNotNone(deduplicator.bloom)
+        self.assertFalse(deduplicator.exact)
+        self.assertEqual(deduplicator.check(('a', )), deduplicator.MAYBE)
+
+
+class ReconcileTest(SimpleTestCase):
+
+    def test_external_sort(self):
+        items = [(number * 7919) % 1000 for number in range(1000)]
+        self.assertEqual(list(external_sort(items, key=lambda x: x,
+                                            max_items=64)),
+                         sorted(items))
+
+    def test_merge_join(self):
+        feed = [(1, 'a'), (2, 'b'), (2, 'b'), (4, 'd')]
+        table = [(2, 'b'), (3, 'c'), (4, 'x')]
+        result = [(status, key) for status, key, record, row in
+                  reconcile.merge_join(feed, table, lambda x, y: x == y)]
+        self.assertEqual(result, [(reconcile.INSERT, 1),
+                                  (reconcile.UNCHANGED, 2),
+                                  (reconcile.UNCHANGED, 2),
+                                  (reconcile.MISSING, 3),
+                                  (reconcile.UPDATE, 4)])
+
+    def test_merge_join_unsorted_table(self):
+        join = reconcile.merge_join([], [(2, 'b'), (1, 'a')],
+                                    lambda x, y: x == y)
+        self.assertRaises(ValueError, list, join)
+
+
+class SpillStoreTest(SimpleTestCase):
+
+    def test_memory(self):
+        with SpillStore(max_memory=1024 * 1024) as store:
+            for number in range(10):
+                store.append('numbers', number)
+            self.assertIsNone(store.connection)
+            self.assertEqual(list(store.iter_chunks('numbers', 4)),
+                             [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+
+    def test_spill(self):
+        with SpillStore(max_memory=64) as store:
+            for number in range(100):
+                store.append('numbers', (number, u'value'))
+                store.append('other', number)
+            file_name = store.file_name
+            self.assertTrue(store.spilled)
+            self.assertTrue(os.path.exists(file_name))
+
+            items = [item for chunk in store.iter_chunks('numbers', 7)
+                     for item in chunk]
+            self.assertEqual(items, [(number, u'value')
+                                     for number in range(100)])
+        self.assertFalse(os.path.exists(file_name))
+
+
+class ChunkControllerTest(SimpleTestCase):
+
+    def test_grow_while_faster(self):
+        controller = ChunkController(size=100, minimum=10, maximum=1000)
+        self.assertEqual(controller.record(100, 1.0), 200)
+        self.assertEqual(controller.record(200, 1.0), 400)
+        # throughput fell, turn back
+        self.assertEqual(controller.record(400, 4.0), 200)
+        self.assertEqual(controller.record(200, 1.5), 100)
+
+    def test_bounds(self):
+        controller = ChunkController(size=5000, minimum=10, maximum=1000)
+        self.assertEqual(controller.size, 1000)
+        self.assertEqual(controller.record(1000, 0.1), 1000)
+
+        controller = ChunkController(size=1000, maximum=10000,
+                                     max_params=999, params_per_row=1)
+        self.assertEqual(controller.maximum, 999)
+
+    def test_latency(self):
+        controller = ChunkController(size=1000, minimum=10, maximum=10000,
+                                     latency=1.0)
+        self.assertEqual(controller.record(1000, 4.0), 250)
+
+    def test_partial_chunk(self):
+        controller = ChunkController(size=100)
+        self.assertEqual(controller.record(30, 1.0), 100)
+
+    def test_write(self):
+        controller = ChunkController(size=2, minimum=2, maximum=8)
+        written = []
+        report = controller.write(range(20), written.append)
+
+        self.assertEqual(sum(written, []), range(20))
+        self.assertEqual(report['rows'], 20)
+        self.assertEqual(report['chunks'], len(written))
+        self.assertEqual(report['sizes'][0], [2, 1])
+        self.assertTrue(all(2 <= len(chunk) <= 8 for chunk in written[:-1]))
+
+
+class IOBoundHookTest(SimpleTestCase):
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(len(cache), 2)
+
+    def test_map_concurrent(self):
+        condition = threading.Condition()
+        running = []
+        concurrent = []
+
+        def lookup(value):
+            # every distinct value of column must be waited at once
+            with condition:
+                running.append(value)
+                condition.notify_all()
+                deadline = time.time() + 5
+                while len(running) < 3 and time.time() < deadline:
+                    condition.wait(deadline - time.time())
+                concurrent.append(len(running) >= 3)
+            return value * 2
+
+        hook = IOBoundHook(lookup, workers=3)
+        try:
+            self.assertEqual(hook.map([1, 2, 1, 3]), [2, 4, 2, 6])
+        finally:
+            hook.close()
+        self.assertEqual(concurrent, [True] * 3)
+        self.assertEqual(len(hook.cache), 3)
+
+    def test_map_cached(self):
+        calls = []
+        hook = IOBoundHook(lambda value: calls.append(value) or value,
+                           workers=1, cache_size=10)
+        self.assertEqual(hook.map(['a', 'b']), ['a', 'b'])
+        self.assertEqual(hook('a'), 'a')
+        self.assertEqual(calls, ['a', 'b'])
+
+    def test_map_unhashable(self):
+        hook = IOBoundHook(len, workers=1)
+        self.assertEqual(hook.map([[1], [1, 2]]), [1, 2])
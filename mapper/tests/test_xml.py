@@ -1,14 +1,27 @@
 # coding: utf-8
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
 from datetime import date, datetime
 
 from lxml import etree
 
-from django.test import TestCase
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase
 from mapper.utils.base import HookRegistry
 
-from .utils import load_source_abs_path
+from .utils import load_source_abs_path, generate_events_feed
+from .utils import QueryBudgetMixin, StageQueries
+from ..signals import bulk_changed, suppress_signals, CREATED, UPDATED
 from ..utils import load_backend
 from ..utils.xml import XmlFieldParser, XmlManyToManyFieldParser, XmlModelParser
+from ..utils.xml import XmlShardIndex
+from ..utils.daemon import ImportDaemon
+from ..utils.session import BulkSession
 from ..tests.models import Event, Place, EventDate, Owner, Organizer
 
 
@@ -71,6 +84,91 @@ class XmlMapperTestSuite(TestCase):
         self.assertEqual(Organizer.objects.count(), 1)
         self.assertEqual(EventDate.objects.count(), 2)
 
+    def test_interned_per_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = generate_events_feed(
+                os.path.join(directory, 'feed.rss'), 10, organizers=5
+            )
+            self.backend.load(file_name, self.schema)
+        finally:
+            shutil.rmtree(directory)
+        self.backend.load(load_source_abs_path(self.source_file), self.schema)
+
+        parser, = self.backend.load_parsers(self.schema)
+        organizer = parser.fields[parser.field_names.index('organizer')]
+        self.assertEqual(organizer.interned, {' organizer 1 ': ' organizer 1 '})
+
+    def test_io_bound_hook(self):
+        calls = []
+
+        def lookup(value):
+            calls.append(value)
+            return value.strip().upper()
+
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'], fields={
+            'title': {'query': 'title', 'hook': 'lookup'},
+            'organizer': {'query': 'organizer', 'model': 'mapper.Organizer',
+                          'field': 'title', 'hook': 'lookup'}
+        })}
+        file_name = load_source_abs_path(self.source_file)
+        HookRegistry.registry('lookup', lookup, io_bound=True)
+        try:
+            self.backend.load(file_name, schema)
+            first_calls = sorted(calls)
+            self.backend.load(file_name, schema)
+        finally:
+            HookRegistry.hooks.pop('lookup')
+
+        self.assertEqual(sorted(Event.objects.values_list('title', flat=True)),
+                         ['SOME TITLE', 'SOME TITLE 1'])
+        self.assertEqual(Organizer.objects.get().title, 'ORGANIZER 1')
+        # distinct values of chunk looked up once
+        self.assertEqual(first_calls, [' organizer 1 ', ' some title',
+                                       ' some title 1'])
+        self.assertEqual(len(calls), 3, 'results must be cached')
+
+    def test_load_report(self):
+        backend = load_backend('xml', cached=False)
+        backend.chunk_bounds = (1, 10000)
+        backend.chunk_size = 1
+        report = backend.load(load_source_abs_path(self.source_file),
+                              self.schema)
+
+        rows = report['mapper.Event']['flush_rows']
+        self.assertEqual(rows['rows'], 2)
+        self.assertEqual(rows['sizes'][0], [1, 1])
+        # sqlite parameters limit bound chunks with related lookups
+        self.assertEqual(rows['bounds'], (1, 999))
+        self.assertEqual(report['mapper.Event']['flush_links']['rows'], 2)
+
+    def test_load_spilled(self):
+        backend = load_backend('xml', cached=False)
+        backend.spill_memory = 64
+        backend.chunk_size = 1
+        backend.chunk_bounds = (1, 1)
+        backend.load(load_source_abs_path(self.source_file), self.schema)
+
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(EventDate.objects.count(), 2)
+
+    def test_dispatch_records(self):
+        schema = dict(self.schema)
+        schema['mapper.Place'] = {
+            'query': 'channel.places.place',
+            'fields': {'title': 'title'}
+        }
+        source = self.backend.load_source(
+            load_source_abs_path(self.source_file)
+        )
+        parsers = self.backend.load_parsers(schema)
+
+        records = self.backend.dispatch_records(source, parsers)
+        for parser in parsers:
+            expected = list(parser.get_source_iterator(source, parser.query))
+            self.assertEqual(records[parser], expected)
+            self.assertEqual(len(records[parser]), 2)
+
 
 class XmlFieldParserTest(TestCase):
     source_file = load_source_abs_path('source/events.rss')
@@ -285,4 +383,835 @@ class XmlModelParserTest(TestCase):
 
         self.assertTrue(sources)
         self.assertIsInstance(sources, list)
-        self.assertEqual(len(sources), 2)
\ No newline at end of file
+        self.assertEqual(len(sources), 2)
+
+    def test_get_item_values(self):
+        parser = XmlModelParser('mapper.Event', self.options)
+        raw_data = next(parser.get_source_iterator(self.source, parser.query))
+        values = parser.get_item_values(raw_data)
+
+        self.assertIsInstance(values, tuple)
+        self.assertEqual(len(values), len(parser.field_names))
+        item = dict(zip(parser.field_names, values))
+        self.assertEqual(item['title'], ' some title')
+        self.assertEqual(item['organizer'], ' organizer 1 ')
+
+        data = parser.resolve_item(values)
+        self.assertIsInstance(data['organizer'], Organizer)
+
+
+class XmlQueryBudgetTest(QueryBudgetMixin, TestCase):
+    schema = XmlMapperTestSuite.schema
+    # queries per additional record, lower it when write path improves
+    budget = {
+        'parse': 7,
+        'parse_m2m': 8,
+    }
+    # queries per additional chunk to tables of related lookups,
+    # values of chunk looked up by one query in every stage
+    chunk_budget = {
+        Organizer: 2,
+        Place: 1,
+    }
+
+    def test_load_query_budget(self):
+        backend = load_backend('xml', cached=False)
+        self.assertQueryBudget(backend, self.schema, self.budget)
+
+    def test_related_lookups_chunk_budget(self):
+        backend = load_backend('xml', cached=False)
+        self.assertChunkBudget(backend, self.schema, self.chunk_budget,
+                               organizers=5, places=5)
+
+
+class XmlSchedulerTest(TransactionTestCase):
+    source_file = 'source/events.rss'
+    schema = dict(XmlMapperTestSuite.schema, **{
+        'mapper.Organizer': {
+            'query': 'channel.events.event',
+            'fields': {'title': 'organizer'}
+        },
+        'mapper.Owner': {
+            'query': 'channel.places.place',
+            'fields': {'title': 'owner'}
+        },
+        'mapper.Place': {
+            'query': 'channel.places.place',
+            'fields': {'title': 'title'},
+            'rels': {
+                'owners': {
+                    'query': 'owner',
+                    'model': 'mapper.Owner',
+                    'field': 'title'
+                }
+            }
+        }
+    })
+
+    def setUp(self):
+        self.backend = load_backend('xml', cached=False)
+
+    def test_parser_levels(self):
+        parsers = self.backend.load_parsers(self.schema)
+        levels = [[parser.label for parser in level]
+                  for level in self.backend.get_parser_levels(parsers)]
+
+        self.assertEqual(levels, [['mapper.Organizer', 'mapper.Owner'],
+                                  ['mapper.Place'],
+                                  ['mapper.Event']])
+
+    def test_shared_targets_levels(self):
+        class Parser(object):
+            def __init__(self, model, dependencies):
+                self.model = model
+                self.label = model.__name__
+                self.dependencies = set(dependencies)
+
+            def get_dependencies(self):
+                return self.dependencies
+
+        # both create organizers, nobody produces them
+        parsers = [Parser(Event, [Organizer]), Parser(Place, [Organizer]),
+                   Parser(Owner, [])]
+        levels = [[parser.label for parser in level]
+                  for level in self.backend.get_parser_levels(parsers)]
+
+        self.assertEqual(levels, [['Event', 'Owner'], ['Place']])
+
+    def test_load_concurrent(self):
+        self.backend.load(load_source_abs_path(self.source_file),
+                          self.schema, workers=2)
+
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(Organizer.objects.count(), 1)
+        self.assertEqual(Owner.objects.count(), 1)
+        self.assertEqual(Place.objects.count(), 2)
+        self.assertEqual(EventDate.objects.count(), 2)
+        self.assertEqual(Place.objects.filter(owners__isnull=False).count(),
+                         2)
+
+
+class XmlShardTest(TestCase):
+    schema = XmlMapperTestSuite.schema
+    query = 'channel.events.event'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = generate_events_feed(
+            os.path.join(self.directory, 'feed.rss'), 20
+        )
+        self.backend = load_backend('xml', cached=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build_index(self):
+        index = XmlShardIndex.load(self.file_name, self.query)
+        self.assertEqual(len(index.records), 20)
+        self.assertTrue(os.path.exists(
+            XmlShardIndex.get_index_name(self.file_name)
+        ))
+
+        with open(self.file_name, 'rb') as source:
+            data = source.read()
+        for start, end in index.records:
+            element = etree.fromstring(data[start:end])
+            self.assertEqual(element.tag, 'event')
+
+        saved = XmlShardIndex.read(self.file_name)
+        self.assertEqual(saved.records, index.records)
+        self.assertEqual(saved.path, ('channel', 'events', 'event'))
+
+    def test_truncated_index(self):
+        index = XmlShardIndex.load(self.file_name, self.query)
+        index_name = XmlShardIndex.get_index_name(self.file_name)
+        with open(index_name) as saved:
+            content = saved.read()
+        with open(index_name, 'w') as saved:
+            saved.write(content[:len(content) // 2])
+
+        self.assertRaises(ValueError, XmlShardIndex.read, self.file_name)
+        self.assertEqual(XmlShardIndex.load(self.file_name, self.query).records,
+                         index.records)
+        self.assertEqual([name for name in os.listdir(self.directory)
+                          if name.startswith('feed.rss.idx')], ['feed.rss.idx'])
+
+    def test_shards(self):
+        shards = self.backend.get_shards(self.file_name, self.query, 3)
+        self.assertEqual(len(shards), 3)
+        self.assertEqual(sum(shard.count for shard in shards), 20)
+        for shard in shards:
+            self.assertTrue(shard.count >= 6)
+
+    def test_load_shards(self):
+        shards = self.backend.get_shards(self.file_name, self.query, 3)
+        for shard in shards + shards[:1]:
+            self.backend.load_shard(self.file_name, self.schema, shard,
+                                    self.query)
+
+        self.assertEqual(Event.objects.count(), 20)
+        self.assertEqual(EventDate.objects.count(), 20)
+
+    def test_load_shards_other_models(self):
+        shard = self.backend.get_shards(self.file_name, self.query, 1)[0]
+        schema = dict(self.schema, **{'mapper.Place': {
+            'query': 'channel.places.place',
+            'fields': {'title': 'title'}
+        }})
+        self.assertRaises(ValueError, self.backend.load_shard,
+                          self.file_name, schema, shard, self.query)
+        self.assertEqual(Event.objects.count(), 0)
+
+        # nested records of sharded path loaded
+        schema = dict(self.schema, **{'mapper.Organizer': {
+            'query': 'events.event.organizer',
+            'fields': {'title': 'title'}
+        }})
+        self.backend.check_shard_parsers(
+            self.backend.load_parsers(schema),
+            XmlShardIndex.get_path(self.query)
+        )
+
+
+class XmlMultiDatabaseTest(TestCase):
+    multi_db = True
+    source_file = 'source/events.rss'
+    schema = XmlMapperTestSuite.schema
+
+    def setUp(self):
+        self.backend = load_backend('xml', cached=False)
+
+    def test_load_using(self):
+        self.backend.load(load_source_abs_path(self.source_file),
+                          self.schema, using='secondary')
+
+        self.assertEqual(Event.objects.count(), 0)
+        self.assertEqual(Event.objects.using('secondary').count(), 2)
+        self.assertEqual(Organizer.objects.using('secondary').count(), 1)
+        self.assertEqual(EventDate.objects.using('secondary').count(), 2)
+
+    def test_schema_using(self):
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'],
+                                       using='secondary')}
+        self.backend.load(load_source_abs_path(self.source_file), schema)
+        self.assertEqual(Event.objects.using('secondary').count(), 2)
+
+        self.backend.load(load_source_abs_path(self.source_file), schema,
+                          using={'mapper.Event': 'default'})
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_read_using(self):
+        Organizer.objects.using('secondary').create(title=' organizer 1 ')
+
+        self.backend.load(load_source_abs_path(self.source_file),
+                          self.schema, read_using='secondary')
+
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(Organizer.objects.count(), 0,
+                         'existing organizer must be found in read database')
+
+
+class XmlDedupeTest(TestCase):
+    schema = XmlMapperTestSuite.schema
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'feed.rss')
+        with open(self.file_name, 'w') as feed:
+            feed.write('<rss><channel><events>')
+            for number in range(20):
+                feed.write('<event><title>event {}</title>'
+                           '<organizer>organizer</organizer>'
+                           '<place>place</place>'
+                           '<date>15.03.2014</date></event>'
+                           .format(number % 2))
+            feed.write('</events></channel></rss>')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def count_parse_queries(self, schema, stage='parse'):
+        backend = load_backend('xml', cached=False)
+        with StageQueries(backend) as queries:
+            backend.load(self.file_name, schema)
+        return queries.counts[stage]
+
+    def test_dedupe(self):
+        plain = self.count_parse_queries(self.schema)
+        Event.objects.all().delete()
+
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'],
+                                       dedupe={'key': ['title']})}
+        deduped = self.count_parse_queries(schema)
+
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertLess(deduped, plain)
+
+    def test_dedupe_links(self):
+        plain = self.count_parse_queries(self.schema, 'parse_m2m')
+        Event.objects.all().delete()
+
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'],
+                                       dedupe={'key': ['title']})}
+        deduped = self.count_parse_queries(schema, 'parse_m2m')
+
+        self.assertEqual(EventDate.objects.count(), 2)
+        self.assertLess(deduped * 2, plain)
+
+    def test_dedupe_all_fields(self):
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'],
+                                       dedupe=True)}
+        self.count_parse_queries(schema)
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(EventDate.objects.count(), 2)
+
+    def test_dedupe_other_links(self):
+        with open(self.file_name, 'w') as feed:
+            feed.write('<rss><channel><events>')
+            for place in ('place 1', 'place 2'):
+                feed.write('<event><title>event</title>'
+                           '<organizer>organizer</organizer>'
+                           '<place>{}</place>'
+                           '<date>15.03.2014</date></event>'.format(place))
+            feed.write('</events></channel></rss>')
+
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'],
+                                       dedupe={'exact_limit': 1000})}
+        self.count_parse_queries(schema)
+        self.assertEqual(Event.objects.count(), 1)
+        self.assertEqual(sorted(EventDate.objects.values_list('place__title',
+                                                              flat=True)),
+                         ['place 1', 'place 2'])
+
+    def test_dedupe_bloom(self):
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'],
+                                       dedupe={'exact_limit': 1,
+                                               'capacity': 100,
+                                               'error_rate': 0.01})}
+        self.count_parse_queries(schema)
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_dedupe_wrong_key(self):
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'],
+                                       dedupe={'key': ['unknown']})}
+        backend = load_backend('xml', cached=False)
+        self.assertRaises(ValueError, backend.load_parsers, schema)
+
+
+class XmlReconcileTest(TestCase):
+    source_file = 'source/events.rss'
+    schema = {
+        'mapper.Event': {
+            'query': 'channel.events.event',
+            'key': ['title'],
+            'fields': XmlMapperTestSuite.schema['mapper.Event']['fields']
+        }
+    }
+
+    def setUp(self):
+        self.backend = load_backend('xml', cached=False)
+        self.file_name = load_source_abs_path(self.source_file)
+
+    def test_reconcile(self):
+        organizer = Organizer.objects.create(title=' organizer 1 ')
+        Event.objects.create(title=' some title', organizer=organizer)
+        Event.objects.create(title=' some title 1')
+        Event.objects.create(title='removed')
+
+        report = self.backend.reconcile(self.file_name, self.schema,
+                                        max_items=1)
+        self.assertEqual(report['mapper.Event'], {'insert': 0,
+                                                  'update': 1,
+                                                  'unchanged': 1,
+                                                  'missing': 1})
+        self.assertFalse(Event.objects.get(title=' some title 1').organizer)
+
+    def test_reconcile_apply(self):
+        Event.objects.create(title=' some title 1')
+
+        report = self.backend.reconcile(self.file_name, self.schema,
+                                        apply=True)
+        self.assertEqual(report['mapper.Event'], {'insert': 1,
+                                                  'update': 1,
+                                                  'unchanged': 0,
+                                                  'missing': 0})
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(
+            Event.objects.filter(organizer__title=' organizer 1 ').count(), 2
+        )
+
+    def test_reconcile_date_key(self):
+        EventDate.objects.create(date=date(2014, 3, 20), description='old')
+        schema = {'mapper.EventDate': {
+            'query': 'channel.events.event',
+            'key': ['date'],
+            'fields': {'date': {'query': 'date', 'hook': 'date'},
+                       'description': 'title'}
+        }}
+
+        report = self.backend.reconcile(self.file_name, schema, max_items=1)
+        self.assertEqual(report['mapper.EventDate'], {'insert': 1,
+                                                      'update': 1,
+                                                      'unchanged': 0,
+                                                      'missing': 0})
+
+
+class XmlBulkSignalsTest(TestCase):
+    source_file = 'source/events.rss'
+    schema = XmlMapperTestSuite.schema
+
+    def setUp(self):
+        self.saved = []
+        self.bulk = []
+        post_save.connect(self.on_save)
+        bulk_changed.connect(self.on_bulk_changed)
+
+    def tearDown(self):
+        post_save.disconnect(self.on_save)
+        bulk_changed.disconnect(self.on_bulk_changed)
+
+    def on_save(self, sender, **kwargs):
+        self.saved.append(sender)
+
+    def on_bulk_changed(self, sender, pks, operation, using, **kwargs):
+        self.bulk.append((sender, operation, len(pks)))
+
+    def test_default_signals(self):
+        load_backend('xml', cached=False).load(
+            load_source_abs_path(self.source_file), self.schema
+        )
+        self.assertEqual(self.saved.count(Event), 2)
+        self.assertFalse(self.bulk)
+
+    def test_bulk_signals(self):
+        load_backend('xml', cached=False).load(
+            load_source_abs_path(self.source_file), self.schema,
+            bulk_signals=True
+        )
+        self.assertFalse(self.saved)
+        self.assertEqual(sorted(self.bulk, key=lambda x: x[0].__name__),
+                         [(Event, CREATED, 2),
+                          (EventDate, CREATED, 2),
+                          (Organizer, CREATED, 1),
+                          (Place, CREATED, 2)])
+
+        Owner.objects.create(title='owner')
+        self.assertEqual(self.saved, [Owner],
+                         'receivers must be restored after load')
+
+    def test_options_per_load(self):
+        # cached instance is shared by loads of thread
+        backend = load_backend('xml')
+        file_name = load_source_abs_path(self.source_file)
+        backend.load(file_name, self.schema, bulk_signals=True, workers=2)
+        self.assertFalse(self.saved)
+
+        Event.objects.all().delete()
+        backend.load(file_name, self.schema)
+        self.assertEqual(backend.load_options, {'workers': 1,
+                                                'bulk_signals': False,
+                                                'bulk_session': False})
+        self.assertIn(Event, self.saved, 'options must not stick')
+
+    def test_suppressed_per_thread(self):
+        with suppress_signals():
+            Owner.objects.create(title='suppressed')
+            thread = threading.Thread(
+                target=lambda: post_save.send(sender=Organizer, instance=None,
+                                              created=True)
+            )
+            thread.start()
+            thread.join()
+        self.assertEqual(self.saved, [Organizer],
+                         'signals of other threads must be delivered')
+
+    def test_reconcile_updated(self):
+        event = Event.objects.create(title=' some title 1')
+        load_backend('xml', cached=False).reconcile(
+            load_source_abs_path(self.source_file), XmlReconcileTest.schema,
+            apply=True
+        )
+        self.assertIn((Event, UPDATED, 1), self.bulk)
+        self.assertIn((Event, CREATED, 1), self.bulk)
+        self.assertEqual(self.saved.count(Event), 1,
+                         'update sends no save signals')
+        self.assertTrue(Event.objects.get(pk=event.pk).organizer)
+
+
+class XmlExportTest(TestCase):
+    source_file = 'source/events.rss'
+    schema = {
+        'mapper.Event': dict(XmlMapperTestSuite.schema['mapper.Event'], rels={
+            'places': dict(
+                XmlMapperTestSuite.schema['mapper.Event']['rels']['places'],
+                fields={'date': {'query': 'date', 'hook': 'date',
+                                 'export_hook': 'date_export'}}
+            )
+        })
+    }
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = load_backend('xml', cached=False)
+        self.backend.load(load_source_abs_path(self.source_file), self.schema)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_events(self):
+        return sorted(
+            (event.title, event.organizer.title, date.place.title, date.date)
+            for event in Event.objects.all()
+            for date in event.eventdate_set.all()
+        )
+
+    def test_export(self):
+        file_name = os.path.join(self.directory, 'events.xml')
+        self.backend.export(file_name, self.schema, root='rss', chunk_size=1)
+
+        events = etree.parse(file_name).findall('channel/events/event')
+        self.assertEqual(len(events), 2)
+        self.assertEqual(
+            sorted(event.findtext('title') for event in events),
+            [' some title', ' some title 1']
+        )
+        self.assertEqual(events[0].findtext('date'), '15.03.2014')
+
+    def test_export_round_trip(self):
+        expected = self.get_events()
+        file_name = os.path.join(self.directory, 'events.xml')
+        self.backend.export(file_name, self.schema)
+
+        for model in (EventDate, Event, Place, Organizer):
+            model.objects.all().delete()
+        self.backend.load(file_name, self.schema)
+        self.assertEqual(self.get_events(), expected)
+
+    def test_export_failed(self):
+        def broken(value):
+            raise RuntimeError('broken hook')
+
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'], fields={
+            'title': {'query': 'title', 'export_hook': broken}
+        })}
+        for backend in ('xml', 'json'):
+            file_name = os.path.join(self.directory, 'events.' + backend)
+            with open(file_name, 'w') as previous:
+                previous.write('previous')
+
+            self.assertRaises(RuntimeError,
+                              load_backend(backend, cached=False).export,
+                              file_name, schema)
+            with open(file_name) as previous:
+                self.assertEqual(previous.read(), 'previous')
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['events.json', 'events.xml'])
+
+    def test_export_json(self):
+        file_name = os.path.join(self.directory, 'events.json')
+        load_backend('json', cached=False).export(file_name, self.schema)
+
+        with open(file_name) as exported:
+            data = json.load(exported)
+        events = data['channel']['events']['event']
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0]['organizer'], ' organizer 1 ')
+        self.assertEqual(events[0]['place'], ' some place 1')
+        self.assertEqual(events[0]['date'], '15.03.2014')
+
+
+class XmlDaemonTest(TransactionTestCase):
+    source_file = 'source/events.rss'
+    schema = 'mapper.tests.test_xml.EVENTS_SCHEMA'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        shutil.copy(load_source_abs_path(self.source_file),
+                    os.path.join(self.directory, 'events.rss'))
+        self.daemon = ImportDaemon(
+            max_jobs=2, spool=self.directory,
+            socket_path=os.path.join(self.directory, 'mapper.sock')
+        )
+        self.daemon.start()
+
+    def tearDown(self):
+        if not self.daemon.stopped.is_set():
+            self.daemon.stop()
+        shutil.rmtree(self.directory)
+
+    def request(self, data):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.daemon.socket_path)
+        try:
+            connection.sendall(json.dumps(data) + '\n')
+            return json.loads(connection.makefile().readline())
+        finally:
+            connection.close()
+
+    def test_spool(self):
+        with open(os.path.join(self.directory, 'events.job'), 'w') as job:
+            json.dump({'file_name': 'events.rss', 'schema': self.schema,
+                       'backend': 'xml'}, job)
+        with open(os.path.join(self.directory, 'broken.job'), 'w') as job:
+            job.write('{}')
+
+        self.daemon.scan_spool()
+        self.daemon.stop()
+
+        with open(os.path.join(self.directory, 'events.done')) as result:
+            self.assertEqual(json.load(result)['status'], 'done')
+        self.assertTrue(os.path.exists(os.path.join(self.directory,
+                                                    'broken.failed')))
+        self.assertFalse([name for name in os.listdir(self.directory)
+                          if name.endswith(('.job', '.running'))])
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(EventDate.objects.count(), 2)
+
+    def test_socket(self):
+        job = {'file_name': os.path.join(self.directory, 'events.rss'),
+               'schema': self.schema, 'wait': True}
+        stats = self.request(job)
+        self.assertEqual(stats['status'], 'done', stats['error'])
+        misses = self.daemon.cache.get_stats()['misses']
+
+        # related instances of first job reused
+        self.assertEqual(self.request(job)['status'], 'done')
+        self.assertEqual(self.daemon.cache.get_stats()['misses'], misses)
+
+        stats = self.request({'command': 'stats'})
+        self.assertEqual([job['status'] for job in stats['jobs']],
+                         ['done', 'done'])
+        self.assertIn('error', self.request({'file_name': 'events.rss'}))
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_callback_failed(self):
+        def callback(job):
+            raise IOError('spool not writable')
+
+        job = {'file_name': os.path.join(self.directory, 'events.rss'),
+               'schema': self.schema}
+        self.assertTrue(self.daemon.submit(callback=callback,
+                                           **job).done.wait(10))
+        # worker survived
+        self.assertTrue(self.daemon.submit(**job).done.wait(10))
+        self.assertTrue(all(thread.is_alive()
+                            for thread in self.daemon.threads))
+
+    def test_cache_invalidation(self):
+        job = {'file_name': os.path.join(self.directory, 'events.rss'),
+               'schema': self.schema}
+        self.daemon.submit(**job).done.wait()
+        cache = self.daemon.cache
+        self.assertTrue(cache.get_stats()['size'])
+
+        Organizer.objects.all().delete()
+        self.assertFalse(cache.get(Organizer, 'title'))
+
+        self.daemon.submit(**job).done.wait()
+        self.assertEqual(Organizer.objects.count(), 1)
+        self.assertTrue(cache.get(Place, 'title'))
+
+        # changes of other processes found by table state
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(Place._meta.db_table))
+        cache.validate()
+        self.assertFalse(cache.get(Place, 'title'))
+        self.assertTrue(cache.get(Organizer, 'title'))
+
+
+EVENTS_SCHEMA = XmlMapperTestSuite.schema
+
+
+class XmlBulkSessionTest(TransactionTestCase):
+    source_file = 'source/events.rss'
+    schema = XmlMapperTestSuite.schema
+    pragmas = ('journal_mode', 'synchronous', 'cache_size')
+
+    def get_pragmas(self, alias='default'):
+        with connections[alias].cursor() as cursor:
+            values = []
+            for name in self.pragmas:
+                cursor.execute('PRAGMA {}'.format(name))
+                values.append(cursor.fetchone()[0])
+            return values
+
+    def test_session(self):
+        original = self.get_pragmas()
+        opened = []
+
+        def open_connection(session=None):
+            if session is not None:
+                session.attach()
+            opened.append(self.get_pragmas())
+            connections.close_all()
+
+        with BulkSession(['default']) as session:
+            self.assertEqual(self.get_pragmas(), ['memory', 0, -65536])
+            # worker threads attached to session get its settings,
+            # connections of other threads not changed
+            for args in ((session, ), ()):
+                thread = threading.Thread(target=open_connection, args=args)
+                thread.start()
+                thread.join()
+        self.assertEqual(opened, [['memory', 0, -65536], original])
+        self.assertEqual(self.get_pragmas(), original)
+        self.assertEqual(self.get_pragmas('secondary')[1], 2)
+
+    def test_load(self):
+        original = self.get_pragmas()
+        load_backend('xml', cached=False).load(
+            load_source_abs_path(self.source_file), self.schema,
+            bulk_session=True
+        )
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(EventDate.objects.count(), 2)
+        self.assertEqual(self.get_pragmas(), original)
+
+    def test_load_concurrent(self):
+        original = self.get_pragmas()
+        schema = dict(self.schema, **XmlSchedulerTest.schema)
+        load_backend('xml', cached=False).load(
+            load_source_abs_path(self.source_file), schema,
+            bulk_session=True, workers=2
+        )
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(Owner.objects.count(), 1)
+        self.assertEqual(self.get_pragmas(), original)
+
+    def test_restore_on_failure(self):
+        def broken(value):
+            raise RuntimeError('broken hook')
+
+        schema = {'mapper.Event': dict(self.schema['mapper.Event'], fields={
+            'title': {'query': 'title', 'hook': 'broken'}
+        })}
+        original = self.get_pragmas()
+        HookRegistry.registry('broken', broken)
+        try:
+            self.assertRaises(RuntimeError,
+                              load_backend('xml', cached=False).load,
+                              load_source_abs_path(self.source_file), schema,
+                              bulk_session=True)
+        finally:
+            HookRegistry.hooks.pop('broken')
+        self.assertEqual(self.get_pragmas(), original)
+
+    def test_restore_broken_transaction(self):
+        original = self.get_pragmas()
+        session = BulkSession(['default'])
+        with transaction.atomic():
+            # load failed inside atomic block of caller
+            transaction.set_rollback(True)
+            session.restore(connection, [('cache_size', 0)])
+        self.assertEqual(self.get_pragmas(), original)
+
+
+class XmlPreviewTest(TestCase):
+    source_file = 'source/events.rss'
+    schema = dict(XmlMapperTestSuite.schema, **{
+        'mapper.Place': {
+            'query': 'channel.places.place',
+            'fields': {'title': 'title'}
+        }
+    })
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = load_backend('xml', cached=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_preview(self):
+        # related lookups only
+        with self.assertNumQueries(2):
+            preview = self.backend.preview(
+                load_source_abs_path(self.source_file), self.schema, limit=1
+            )
+        self.assertEqual(Event.objects.count(), 0)
+
+        event, = preview['mapper.Event']
+        self.assertEqual(event['values'], {'title': ' some title',
+                                           'organizer': ' organizer 1 '})
+        self.assertEqual(event['related'], {'organizer': None})
+        places = event['rels']['places']
+        self.assertEqual(places['value'], ' some place 1')
+        self.assertIsNone(places['target'])
+        self.assertEqual(places['through'], {'date': datetime(2014, 3, 15)})
+        self.assertEqual(preview['mapper.Place'][0]['values'],
+                         {'title': ' some place 1'})
+
+    def test_preview_targets(self):
+        self.backend.load(load_source_abs_path(self.source_file),
+                          self.schema)
+        preview = self.backend.preview(
+            load_source_abs_path(self.source_file), self.schema
+        )
+        self.assertEqual(len(preview['mapper.Event']), 2)
+        event = preview['mapper.Event'][1]
+        self.assertEqual(event['related']['organizer'],
+                         Organizer.objects.get())
+        self.assertEqual(event['rels']['places']['target'],
+                         Place.objects.get(title=' some place 2'))
+
+    def test_stop_early(self):
+        # broken tail never read
+        file_name = os.path.join(self.directory, 'broken.rss')
+        with open(file_name, 'w') as feed:
+            with open(load_source_abs_path(self.source_file)) as source:
+                content = source.read()
+            feed.write(content[:content.index('</event>') + 8] + '<broken')
+
+        preview = self.backend.preview(
+            file_name, {'mapper.Event': self.schema['mapper.Event']}, limit=1
+        )
+        self.assertEqual(preview['mapper.Event'][0]['values']['title'],
+                         ' some title')
+        self.assertRaises(etree.XMLSyntaxError, self.backend.load,
+                          file_name, self.schema)
+
+    def test_nested_records(self):
+        file_name = os.path.join(self.directory, 'nested.rss')
+        with open(file_name, 'w') as feed:
+            feed.write('<rss><channel><events>'
+                       '<event><name>event</name>'
+                       '<organizer><title>organizer</title></organizer>'
+                       '</event></events></channel></rss>')
+        schema = {
+            'mapper.Event': {
+                'query': 'channel.events.event',
+                'fields': {'title': 'name',
+                           'organizer': {'query': 'organizer.title',
+                                         'model': 'mapper.Organizer',
+                                         'field': 'title'}}
+            },
+            'mapper.Organizer': {
+                'query': 'channel.events.event.organizer',
+                'fields': {'title': 'title'}
+            }
+        }
+
+        preview = self.backend.preview(file_name, schema)
+        self.assertEqual(preview['mapper.Event'][0]['values'],
+                         {'title': 'event', 'organizer': 'organizer'})
+        self.assertEqual(preview['mapper.Organizer'][0]['values'],
+                         {'title': 'organizer'})
+
+    def test_sample(self):
+        file_name = generate_events_feed(
+            os.path.join(self.directory, 'feed.rss'), 1000
+        )
+        schema = {'mapper.Event': {'query': 'channel.events.event',
+                                   'fields': {'title': 'title'}}}
+        preview = self.backend.preview(file_name, schema, limit=10,
+                                       sample=True, seed=1)
+        titles = [event['values']['title']
+                  for event in preview['mapper.Event']]
+        self.assertEqual(len(set(titles)), 10)
+        self.assertTrue(max(int(title.split()[1]) for title in titles) >= 100,
+                        'sample must be spread over file')
+        self.assertEqual(
+            self.backend.preview(file_name, schema, limit=10, sample=True,
+                                 seed=1)['mapper.Event'],
+            preview['mapper.Event']
+        )
@@ -1,5 +1,11 @@
 import os
+import shutil
 import sys
+import tempfile
+from collections import OrderedDict
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
 
 rel = lambda x: os.path.join(os.path.dirname(__file__), x)
 
@@ -12,4 +18,187 @@ def load_source_abs_path(file_path):
 
 
 def is_test_env():
-    return 'test' in sys.argv
\ No newline at end of file
+    return 'test' in sys.argv
+
+
+def generate_events_feed(file_name, count, organizers=100, places=100):
+    """
+    Write synthetic events feed in format of `source/events.rss`
+    :param file_name: full path of result file
+    :param count: number of events
+    :param organizers: number of distinct organizers
+    :param places: number of distinct places
+    """
+    with open(file_name, 'w') as feed:
+        feed.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                   '<rss version="2.0"><channel><events>\n')
+        for number in xrange(count):
+            feed.write(
+                '<event><title>event {number}</title>'
+                '<date>{day:02d}.03.2014</date>'
+                '<place>place {place}</place>'
+                '<organizer>organizer {organizer}</organizer></event>\n'
+                .format(number=number,
+                        day=number % 28 + 1,
+                        place=number % places,
+                        organizer=number % organizers)
+            )
+        feed.write('</events><places>\n')
+        for number in xrange(places):
+            feed.write('<place><title>place {number}</title>'
+                       '<owner>owner {owner}</owner></place>\n'
+                       .format(number=number, owner=number % 10))
+        feed.write('</places></channel></rss>\n')
+    return file_name
+
+
+class StageQueries(object):
+    """
+    Count queries issued by every stage of backend load.
+    Wrap `run_stage` of backend instance while active
+    """
+
+    def __init__(self, backend, using=DEFAULT_DB_ALIAS):
+        self.backend = backend
+        self.connection = connections[using]
+        self.counts = OrderedDict()
+        # stage -> SQL of captured queries
+        self.queries = OrderedDict()
+
+    def __enter__(self):
+        run_stage = self.backend.run_stage
+
+        def counted_run_stage(stage, method, records):
+            with CaptureQueriesContext(self.connection) as context:
+                run_stage(stage, method, records)
+            self.counts[stage] = (self.counts.get(stage, 0) +
+                                  len(context.captured_queries))
+            self.queries.setdefault(stage, []).extend(
+                query['sql'] for query in context.captured_queries
+            )
+
+        self.backend.run_stage = counted_run_stage
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        del self.backend.run_stage
+
+    def count_table(self, model):
+        """
+        Queries of all stages which read or write table of model
+        """
+        table = self.connection.ops.quote_name(model._meta.db_table)
+        return sum(1 for queries in self.queries.values()
+                   for sql in queries if table in sql)
+
+
+class QueryBudgetMixin(object):
+    """
+    TestCase mixin asserting that queries of backend load grow
+    not faster than declared budget of queries per record
+    """
+    feed_generator = staticmethod(generate_events_feed)
+
+    def load_queries(self, backend, schema, records, **feed_options):
+        """
+        :rtype: StageQueries
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = self.feed_generator(
+                os.path.join(directory, 'feed.rss'), records, **feed_options
+            )
+            with StageQueries(backend) as queries:
+                backend.load(file_name, schema)
+        finally:
+            shutil.rmtree(directory)
+        return queries
+
+    def count_load_queries(self, backend, schema, records):
+        return self.load_queries(backend, schema, records).counts
+
+    def clean_schema_models(self, backend, schema, related=False):
+        """
+        :param related: delete instances of related models too
+        """
+        for parser in backend.load_parsers(schema):
+            models = {parser.model}
+            if related:
+                models.update(parser.get_dependencies())
+            for model in models:
+                model._default_manager.all().delete()
+
+    def assertQueryBudget(self, backend, schema, budget, sizes=(10, 50)):
+        """
+        :param budget: stage -> allowed queries per additional record,
+            0 means stage must not depend on records count
+        :type budget: dict
+        :param sizes: feed sizes compared with each other
+        """
+        small, large = sizes
+        self.clean_schema_models(backend, schema)
+        small_counts = self.count_load_queries(backend, schema, small)
+        self.clean_schema_models(backend, schema)
+        large_counts = self.count_load_queries(backend, schema, large)
+
+        report = '\n'.join(
+            '{stage}: {small} queries for {small_size} records, '
+            '{large} queries for {large_size} records, '
+            'budget {budget} per record'.format(
+                stage=stage,
+                small=small_counts.get(stage, 0),
+                large=large_counts.get(stage, 0),
+                small_size=small, large_size=large,
+                budget=budget.get(stage)
+            )
+            for stage in large_counts
+        )
+
+        for stage, per_record in budget.items():
+            growth = (large_counts.get(stage, 0) -
+                      small_counts.get(stage, 0))
+            allowed = per_record * (large - small)
+            if growth > allowed:
+                self.fail('query budget of stage "{stage}" exceeded: '
+                          '{growth} queries for {records} additional '
+                          'records, allowed {allowed}\n{report}'.format(
+                              stage=stage, growth=growth,
+                              records=large - small, allowed=allowed,
+                              report=report))
+        return large_counts
+
+    def assertChunkBudget(self, backend, schema, budget, chunk_size=10,
+                          sizes=(20, 100), **feed_options):
+        """
+        Assert that queries to tables of batched lookups grow with
+        chunks, not with records. Feed options must fix the number of
+        distinct related values, so rows created for them are the same
+        for both sizes.
+        :param budget: model -> allowed queries to its table per
+            additional chunk, all stages together
+        :type budget: dict
+        :param chunk_size: fixed size of mapping and write chunks
+        :param sizes: feed sizes compared with each other
+        """
+        backend.chunk_size = chunk_size
+        backend.chunk_bounds = (chunk_size, chunk_size)
+        counts = []
+        for records in sizes:
+            self.clean_schema_models(backend, schema, related=True)
+            queries = self.load_queries(backend, schema, records,
+                                        **feed_options)
+            counts.append(dict((model, queries.count_table(model))
+                               for model in budget))
+
+        small, large = sizes
+        chunks = -(-large // chunk_size) - -(-small // chunk_size)
+        for model, per_chunk in budget.items():
+            growth = counts[1][model] - counts[0][model]
+            if growth > per_chunk * chunks:
+                self.fail('chunk budget of {model} exceeded: {growth} '
+                          'queries for {chunks} additional chunks of '
+                          '{records} records, allowed {allowed}'.format(
+                              model=model.__name__, growth=growth,
+                              chunks=chunks, records=large - small,
+                              allowed=per_chunk * chunks))
+        return counts
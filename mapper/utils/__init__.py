@@ -1,25 +1,102 @@
 import sys
+import threading
 from django.conf import settings
-from json import JsonMapperBackend
-from xml import XmlMapperBackend
+from django.utils.module_loading import import_string
 
+from .. import settings as mapper_settings
 
+
+# backends imported on first use, so lxml and etc. not loaded
+# by processes which never map anything
 BACKENDS = {
-    'xml': XmlMapperBackend,
-    'json': JsonMapperBackend
+    'xml': 'mapper.utils.xml.XmlMapperBackend',
+    'json': 'mapper.utils.json.JsonMapperBackend',
+    'csv': 'mapper.utils.csv.CsvMapperBackend',
+    'tsv': 'mapper.utils.csv.TsvMapperBackend'
 }
+ENTRY_POINTS_GROUP = 'django_mapper.backends'
 
+_entry_points = None
+_backend_classes = {}
+_instances = threading.local()
+
+
+def register_backend(name, backend):
+    """
+    :param name: backend name used in `load_backend`
+    :param backend: dotted path to backend class or class itself
+    """
+    BACKENDS[name] = backend
+    _backend_classes.pop(name, None)
 
-def load_backend(backend=None):
-    if backend is None:
-        backend = settings.XML_MAPPER_DEFAULT_BACKEND
 
+def get_entry_points():
+    global _entry_points
+    if _entry_points is None:
+        try:
+            from pkg_resources import iter_entry_points
+        except ImportError:
+            _entry_points = {}
+        else:
+            _entry_points = dict(
+                (entry_point.name, entry_point)
+                for entry_point in iter_entry_points(ENTRY_POINTS_GROUP)
+            )
+    return _entry_points
+
+
+def get_backend_path(backend):
+    """
+    Lookup order: settings.MAPPER_BACKENDS, registered, entry points
+    """
+    custom = getattr(settings, 'MAPPER_BACKENDS', None) or {}
+    if backend in custom:
+        return custom[backend]
     if backend in BACKENDS:
-        backend_cls = BACKENDS[backend]
+        return BACKENDS[backend]
+    return get_entry_points().get(backend)
+
+
+def get_backend_class(backend):
+    path = get_backend_path(backend)
+    if path is None:
+        raise ValueError('backend not found')
+
+    cached = _backend_classes.get(backend)
+    if cached is not None and cached[0] == path:
+        return cached[1]
+
+    if isinstance(path, basestring):
+        backend_cls = import_string(path)
+    elif hasattr(path, 'load'):
+        backend_cls = path.load()
+    else:
+        backend_cls = path
+
+    _backend_classes[backend] = (path, backend_cls)
+    return backend_cls
+
+
+def load_backend(backend=None, cached=True):
+    """
+    :param backend: backend name, default from settings
+    :param cached: reuse instance of this process and thread,
+        which keep compiled parsers between loads
+    """
+    if backend is None:
+        backend = getattr(settings, 'XML_MAPPER_DEFAULT_BACKEND',
+                          mapper_settings.DEFAULT_MAPPING_BACKEND)
+
+    backend_cls = get_backend_class(backend)
+    if not cached:
         return backend_cls()
 
-    raise ValueError('backend not found')
+    instances = _instances.__dict__.setdefault('backends', {})
+    instance = instances.get(backend)
+    if type(instance) is not backend_cls:
+        instance = instances[backend] = backend_cls()
+    return instance
 
 
 def is_test_environment():
-    return 'test' in sys.argv
\ No newline at end of file
+    return 'test' in sys.argv
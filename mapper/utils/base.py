@@ -1,22 +1,109 @@
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
 from django.db.models.base import Model
 from django.utils.datetime_safe import datetime
 from django.utils.text import capfirst
+import copy
+import random
+import threading
 import warnings
+from collections import OrderedDict
 from functools import partial
+from itertools import imap
+from operator import itemgetter, or_
 from django.db.models.loading import get_model
+from multiprocessing.pool import ThreadPool
+
+from .. import settings as mapper_settings
+from .. import signals
+from . import reconcile
+from .dedupe import RecordDeduplicator
+from .spill import external_sort, SpillStore
+from .chunks import ChunkController, get_max_params
+from .hooks import IOBoundHook
+from .session import BulkSession
 
 
 class HookRegistry(object):
     instance = None
     hooks = {}
+    # hooks registered by imports of worker threads too
+    lock = threading.RLock()
+
+    @classmethod
+    def registry(cls, name, hook, io_bound=False, **options):
+        """
+        :param io_bound: hook wait on I/O, run for column of chunk
+            by thread pool with LRU cache of results
+        :param options: `IOBoundHook` options, workers and cache_size
+        """
+        if io_bound:
+            hook = IOBoundHook(hook, **options)
+        with cls.lock:
+            cls.hooks[name] = hook
 
     @classmethod
-    def registry(cls, name, hook):
-        cls.hooks[name] = hook
+    def get(cls, name):
+        with cls.lock:
+            return cls.hooks.get(name)
+
+
+def freeze(value):
+    """
+    Hashable copy of nested options, used as compiled schema cache key
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item))
+                            for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(freeze(item) for item in value)
+    hash(value)
+    return value
+
+
+def get_or_create(model, lookup, using=None, read_using=None):
+    """
+    `get_or_create` with existence lookup sent to read database.
+    :param using: write database alias, router choose it if None
+    :param read_using: database alias for existence lookup
+    """
+    if read_using is not None and read_using != using:
+        try:
+            instance = model._default_manager.using(read_using).get(**lookup)
+        except model.DoesNotExist:
+            pass
+        else:
+            # replica row stands for row of write database
+            instance._state.db = using or instance._state.db
+            return instance, False
+
+    instance, created = model._default_manager.db_manager(
+        using
+    ).get_or_create(**lookup)
+    if created:
+        signals.record_change(model, instance.pk, signals.CREATED,
+                              instance._state.db)
+    return instance, created
+
+
+def iter_chunks(items, size):
+    """
+    Split iterable into lists of `size` items
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 HookRegistry.registry('capfirst', capfirst)
 HookRegistry.registry('date', lambda x: datetime.strptime(x, '%d.%m.%Y'))
+HookRegistry.registry('date_export', lambda x: x.strftime('%d.%m.%Y'))
 
 
 class BaseValidator(object):
@@ -114,7 +201,7 @@ class BaseValidator(object):
 class BaseFieldValidator(BaseValidator):
 
     node_type = 'Model field'
-    fields = ('query', 'model', 'field', 'hook')
+    fields = ('query', 'model', 'field', 'hook', 'export_hook')
     required = ('query', )
     dependencies = (
         ('model', ('field', )),
@@ -179,13 +266,17 @@ class BaseFieldValidator(BaseValidator):
 
         return field
 
+    @classmethod
+    def validate_export_hook(cls, options):
+        return cls.validate_hook({'hook': options.get('export_hook')})
+
     @classmethod
     def validate_hook(cls, options):
         hook = options.get('hook')
         if callable(hook):
             hook = hook
-        elif hook in HookRegistry.hooks:
-            hook = HookRegistry.hooks[hook]
+        elif HookRegistry.get(hook) is not None:
+            hook = HookRegistry.get(hook)
         else:
             cls.field_broken_error(
                 'hook {hook}'.format(hook=hook),
@@ -200,7 +291,7 @@ class BaseManyToManyValidator(BaseFieldValidator):
 
     node_type = 'Many to Many field parser'
     fields = ('query', 'model', 'field', 'through', 'left_field',
-              'right_field', 'hook', 'fields')
+              'right_field', 'hook', 'export_hook', 'fields')
     required = ('query', 'model', 'field')
     dependencies = (
         ('model', ('field', )),
@@ -210,7 +301,7 @@ class BaseManyToManyValidator(BaseFieldValidator):
         ('through', ('left_field', 'right_field')),
         ('fields', ('through', ))
     )
-    plain_validator_cls = BaseValidator
+    plain_validator_cls = BaseFieldValidator
 
     @classmethod
     def validate_through(cls, options):
@@ -244,6 +335,8 @@ class BaseManyToManyValidator(BaseFieldValidator):
 
 
 class BaseFieldParser(object):
+    __slots__ = ('model', 'name', 'query', 'hook', 'export_hook', 'rel_to',
+                 'rel_to_field', 'interned', 'using', 'read_using', 'cache')
     validator = BaseFieldValidator
 
     class ParseMultipleData(Exception):
@@ -279,8 +372,15 @@ class BaseFieldParser(object):
         options = self.validator.validate(options)
         self.query = options['query']
         self.hook = options['hook']
+        self.export_hook = options['export_hook']
         self.rel_to = options['model']
         self.rel_to_field = options['field']
+        # values of related fields repeat often (organizer, place names),
+        # kept for one load only, see `clear_interned`
+        self.interned = {} if self.rel_to else None
+        self.using = self.read_using = None
+        # related instances kept between loads, see `set_cache`
+        self.cache = None
 
     def get_raw_value(self, raw_data, query):
         raise NotImplementedError
@@ -298,65 +398,214 @@ class BaseFieldParser(object):
         return value[0] if hasattr(value, '__iter__') else value
 
     @staticmethod
-    def _get_foreign_value(value, model, field):
-        inst, created = model.objects.get_or_create(**{field: value})
+    def _get_foreign_value(value, model, field, using=None, read_using=None):
+        inst, created = get_or_create(model, {field: value},
+                                      using=using, read_using=read_using)
         return inst
 
-    def parse(self, raw_data):
+    def intern(self, value):
+        if self.interned is None or not isinstance(value, basestring):
+            return value
+        return self.interned.setdefault(value, value)
+
+    def clear_interned(self):
+        if self.interned is not None:
+            self.interned = {}
+
+    def get_value(self, raw_data):
+        """
+        Value from raw data with applied hook, without database access
+        """
         value = self.process_raw_data(raw_data, query=self.query)
         if self.hook:
             value = self.hook(value)
+        return self.intern(value)
+
+    def get_values(self, items):
+        """
+        Values of chunk of raw records, hook applied to whole column,
+        so I/O bound hooks run concurrently
+        """
+        values = [self.process_raw_data(raw_data, query=self.query)
+                  for raw_data in items]
+        return map(self.intern, self.apply_hook(values))
+
+    def apply_hook(self, values):
+        if not self.hook:
+            return values
+        if getattr(self.hook, 'io_bound', False):
+            return self.hook.map(values)
+        return map(self.hook, values)
+
+    def resolve(self, value):
+        """
+        Instance of related model for value or value itself
+        """
+        if not (self.rel_to and self.rel_to_field):
+            return value
+
+        cache = self.cache
+        if cache is not None:
+            try:
+                instance = cache.get(value)
+            except TypeError:
+                cache = None
+            else:
+                if instance is not None:
+                    cache.count(hits=1)
+                    return instance
+                cache.count(misses=1)
+
+        instance = self._get_foreign_value(value,
+                                           model=self.rel_to,
+                                           field=self.rel_to_field,
+                                           using=self.using,
+                                           read_using=self.read_using)
+        if cache is not None:
+            cache.store({value: instance})
+        return instance
+
+    def set_cache(self, cache):
+        """
+        :param cache: shared between loads, None to look up every load
+        :type cache: mapper.utils.cache.RelatedCache
+        """
+        self.cache = None
+        if cache is not None and self.rel_to and self.rel_to_field:
+            self.cache = cache.get(self.rel_to, self.rel_to_field,
+                                   self.using)
+
+    def lookup(self, value):
+        """
+        Existing instance of related model for value, without writes.
+        None returned if instance not exists
+        """
+        if not (self.rel_to and self.rel_to_field):
+            return value
+        manager = self.rel_to._default_manager.db_manager(
+            self.read_using or self.using
+        )
+        return manager.filter(**{self.rel_to_field: value}).first()
+
+    def resolve_column(self, values, batch_size=None):
+        """
+        Resolve distinct values of column by one query per batch,
+        missing instances created one by one.
+        :param batch_size: values of one query, parameters limit of
+            database by default
+        :return: value -> instance, None for unhashable values
+        """
+        try:
+            distinct = list(set(values))
+        except TypeError:
+            return None
+
+        found = {}
+        cache = self.cache
+        if cache is not None:
+            # single read, other jobs may clear cache meanwhile
+            for value in distinct:
+                instance = cache.get(value)
+                if instance is not None:
+                    found[value] = instance
+            cache.count(hits=len(found))
+            distinct = [value for value in distinct if value not in found]
+
+        queried = {}
+        manager = self.rel_to._default_manager.db_manager(
+            self.read_using or self.using
+        )
+        batch_size = batch_size or get_max_params(manager.db) or 500
+        for start in xrange(0, len(distinct), batch_size):
+            lookup = {'{}__in'.format(self.rel_to_field):
+                      distinct[start:start + batch_size]}
+            for instance in manager.filter(**lookup):
+                if self.read_using and self.using:
+                    instance._state.db = self.using
+                queried.setdefault(getattr(instance, self.rel_to_field),
+                                   instance)
+        if cache is not None:
+            cache.count(misses=len(queried))
+            cache.store(queried)
+        found.update(queried)
+
+        for value in distinct:
+            if value not in found:
+                found[value] = self.resolve(value)
+        return found
+
+    def parse(self, raw_data):
+        return self.resolve(self.get_value(raw_data))
+
+    def export(self, value):
+        """
+        Reverse of parse: text of model value or related instance
+        """
+        if value is None:
+            return None
         if self.rel_to and self.rel_to_field:
-            value = self._get_foreign_value(value,
-                                            model=self.rel_to,
-                                            field=self.rel_to_field)
-        return value
+            value = getattr(value, self.rel_to_field)
+        if self.export_hook:
+            value = self.export_hook(value)
+        return value if isinstance(value, basestring) else unicode(value)
 
     def __unicode__(self):
         return u'{model}->{field}'.format(model=self.model, field=self.name)
 
 
 class BaseManyToManyParseField(BaseFieldParser):
+    __slots__ = ('left_model', 'right_model', 'right_model_field',
+                 'through_model', 'through_fields', 'through_parsers',
+                 'left_field', 'right_field')
     validator = BaseManyToManyValidator
     field_parser_cls = BaseFieldParser
 
     def __init__(self, model, name, options):
         self.name = name
+        self.model = model
         self.left_model = model
+        self.using = self.read_using = None
+        self.cache = None
 
         options = self.validator.validate(options)
         self.query = options['query']
         self.hook = options['hook']
+        self.export_hook = options['export_hook']
         self.right_model = options['model']
         self.right_model_field = options['field']
+        self.rel_to = self.right_model
+        self.rel_to_field = self.right_model_field
         self.through_model = options['through']
         self.through_fields = options['fields']
         self.left_field = options['left_field']
         self.right_field = options['right_field']
+        self.interned = {}
+
+        self.through_parsers = ()
+        if self.through_model and self.through_fields:
+            self.through_parsers = tuple(map(
+                partial(self.field_parser_cls, self.through_model),
+                self.through_fields.keys(),
+                self.through_fields.values()
+            ))
 
     def get_raw_value(self, raw_data, query):
         raise NotImplementedError
 
-    def parse(self, raw_data):
-        value = self.process_raw_data(raw_data, query=self.query)
-        if self.hook:
-            value = self.hook(value)
-        value = self._get_foreign_value(value,
-                                        self.right_model,
-                                        self.right_model_field)
-        return value
+    def get_through_values(self, raw_data):
+        return tuple(field.get_value(raw_data)
+                     for field in self.through_parsers)
+
+    def resolve_through(self, values):
+        return dict((field.name, field.resolve(value))
+                    for field, value in zip(self.through_parsers, values))
+
+    def get_through_data(self, raw_data):
+        return self.resolve_through(self.get_through_values(raw_data))
 
     def get_through_instance(self, raw_data):
         if self.through_model:
-            fields = ()
-            if self.through_fields:
-                fields = map(partial(self.field_parser_cls,
-                                     self.through_model),
-                             self.through_fields.keys(),
-                             self.through_fields.values())
-
-            data = {field.name: field.parse(raw_data) for field in fields}
-            return self.through_model(**data)
+            return self.through_model(**self.get_through_data(raw_data))
 
     def __unicode__(self):
         if self.through_model is None:
@@ -370,6 +619,9 @@ class BaseManyToManyParseField(BaseFieldParser):
 
 
 class BaseModelParser(object):
+    __slots__ = ('model', 'query', 'fields', 'fields_m2m', 'field_names',
+                 'using', 'read_using', 'schema_using', 'schema_read_using',
+                 'dedupe', 'dedupe_key', 'key')
 
     field_parser_cls = BaseFieldParser
     field_parser_m2m_cls = BaseManyToManyParseField
@@ -380,9 +632,64 @@ class BaseModelParser(object):
         options = self.validate(options)
         self.query = options['query']
         self.fields = self.make_fields(self.model, options['fields'])
+        # positional index of mapped record values
+        self.field_names = tuple(field.name for field in self.fields)
+        self.fields_m2m = []
         if options['fields_m2m']:
             self.fields_m2m = self.make_fields_m2m(self.model,
                                                    options['fields_m2m'])
+        self.key = self.make_key(options['key'])
+        self.dedupe = options['dedupe']
+        self.dedupe_key = self.make_dedupe_key(self.dedupe)
+        self.schema_using = options['using']
+        self.schema_read_using = options['read_using']
+        self.set_database(self.schema_using, self.schema_read_using)
+
+    def set_cache(self, cache):
+        """
+        :param cache: related instances shared between loads
+        :type cache: mapper.utils.cache.RelatedCache
+        """
+        for field in self.fields:
+            field.set_cache(cache)
+        for field in self.fields_m2m:
+            field.set_cache(cache)
+            for through_field in field.through_parsers:
+                through_field.set_cache(cache)
+
+    def clear_interned(self):
+        """
+        Drop interned values of previous load, parsers are cached
+        by backend between loads
+        """
+        for field in self.fields:
+            field.clear_interned()
+        for field in self.fields_m2m:
+            field.clear_interned()
+            for through_field in field.through_parsers:
+                through_field.clear_interned()
+
+    def set_database(self, using=None, read_using=None):
+        """
+        :param using: write database alias, router choose it if None
+        :param read_using: database alias for existence lookups
+        """
+        for alias in (using, read_using):
+            if alias is not None and alias not in connections.databases:
+                raise ValueError('{alias} database not found'.format(
+                    alias=alias
+                ))
+
+        self.using = using
+        self.read_using = read_using
+        # related instances must live in the same database
+        for field in self.fields:
+            field.using, field.read_using = using, read_using
+        for field in self.fields_m2m:
+            field.using, field.read_using = using, read_using
+            for through_field in field.through_parsers:
+                through_field.using = using
+                through_field.read_using = read_using
 
     @classmethod
     def make_fields(cls, model, fields):
@@ -390,6 +697,26 @@ class BaseModelParser(object):
                    fields.keys(),
                    fields.values())
 
+    def make_key(self, names):
+        """
+        Indexes of record values which make natural key
+        """
+        if not names:
+            return None
+
+        for name in names:
+            if name not in self.field_names:
+                raise ValueError('key {name} not found in '
+                                 'fields'.format(name=name))
+        return tuple(self.field_names.index(name) for name in names)
+
+    def make_dedupe_key(self, dedupe):
+        # empty dict stands for dedupe=True
+        if dedupe is None:
+            return None
+        return (self.make_key(dedupe.get('key')) or self.key or
+                tuple(range(len(self.field_names))))
+
     @classmethod
     def make_fields_m2m(cls, model, fields):
         return map(partial(cls.field_parser_m2m_cls, model),
@@ -412,6 +739,24 @@ class BaseModelParser(object):
     def validate_query(cls, options):
         return options.get('query')
 
+    @classmethod
+    def validate_dedupe(cls, options):
+        dedupe = options.get('dedupe')
+        if not dedupe:
+            return None
+        if dedupe is True:
+            return {}
+        if not isinstance(dedupe, dict):
+            raise TypeError('dedupe must be True or dict with options')
+
+        unknown = set(dedupe) - {'key', 'exact_limit', 'capacity',
+                                 'error_rate'}
+        if unknown:
+            raise ValueError('unknown dedupe options: {}'.format(
+                ', '.join(sorted(unknown))
+            ))
+        return dedupe
+
     @classmethod
     def validate(cls, options):
         query = cls.validate_query(options)
@@ -428,52 +773,481 @@ class BaseModelParser(object):
         fields_m2m = options.get('rels', ())
         return {'query': query,
                 'fields': fields,
-                'fields_m2m': fields_m2m}
+                'fields_m2m': fields_m2m,
+                'key': options.get('key'),
+                'dedupe': cls.validate_dedupe(options),
+                'using': options.get('using'),
+                'read_using': options.get('read_using')}
 
     def parse(self, source):
-        for raw_data in self.get_source_iterator(source, self.query):
-            self.model.objects.get_or_create(**self.get_item_data(raw_data))
+        self.parse_items(self.get_source_iterator(source, self.query))
 
     def parse_m2m(self, source):
-        for raw_data in self.get_source_iterator(source, query=self.query):
-            left_instances = self.model.objects.filter(
-                **self.get_item_data(raw_data=raw_data)
-            )
+        self.parse_m2m_items(self.get_source_iterator(source,
+                                                      query=self.query))
+
+    def parse_items(self, items, chunk_size=1000):
+        deduplicator = self.make_deduplicator()
+        for chunk in iter_chunks(imap(self.get_item_values, items),
+                                 chunk_size):
+            self.write_rows(chunk, deduplicator)
+
+    def parse_m2m_items(self, items, chunk_size=1000):
+        if self.fields_m2m:
+            deduplicator = self.make_deduplicator()
+            for chunk in iter_chunks(imap(self.get_item_link, items),
+                                     chunk_size):
+                self.write_links(chunk, deduplicator)
+
+    def get_channel(self, kind):
+        return '{kind}:{label}:{id}'.format(kind=kind, label=self.label,
+                                            id=id(self))
+
+    def map_items(self, items, store):
+        """
+        Map chunk of raw records into store column by column, hooks
+        applied to whole columns
+        :type items: list
+        :type store: mapper.utils.spill.SpillStore
+        """
+        columns = [field.get_values(items) for field in self.fields]
+        rows = zip(*columns) if columns else [()] * len(items)
+        channel = self.get_channel('rows')
+        for values in rows:
+            store.append(channel, values)
+
+        if not self.fields_m2m:
+            return
+
+        links = []
+        for field in self.fields_m2m:
+            through = [through_field.get_values(items)
+                       for through_field in field.through_parsers]
+            links.append(zip(field.get_values(items),
+                             zip(*through) if through else
+                             [()] * len(items)))
+
+        channel = self.get_channel('links')
+        for values, item_links in zip(rows, zip(*links)):
+            store.append(channel, (values, item_links))
+
+    def flush_rows(self, store, controller):
+        """
+        :type controller: mapper.utils.chunks.ChunkController
+        :return: report of chunk sizes
+        """
+        deduplicator = self.make_deduplicator()
+        return controller.write(
+            store.iter_items(self.get_channel('rows')),
+            lambda chunk: self.write_rows(chunk, deduplicator)
+        )
+
+    def flush_links(self, store, controller):
+        if not self.fields_m2m:
+            return None
+        deduplicator = self.make_deduplicator()
+        return controller.write(
+            store.iter_items(self.get_channel('links')),
+            lambda chunk: self.write_links(chunk, deduplicator)
+        )
+
+    def get_chunk_params(self, method):
+        """
+        Query parameters which every row of chunk adds: related
+        values of chunk looked up by one `__in` query per column
+        """
+        related = any(field.rel_to and field.rel_to_field
+                      for field in self.fields)
+        if method == 'flush_links':
+            related = related or bool(self.fields_m2m)
+        return 1 if related else 0
+
+    def get_item_links(self, raw_data):
+        """
+        Tuple of (value, through values) by every m2m field
+        """
+        return tuple((field.get_value(raw_data),
+                      field.get_through_values(raw_data))
+                     for field in self.fields_m2m)
+
+    def get_item_link(self, raw_data):
+        return self.get_item_values(raw_data), self.get_item_links(raw_data)
+
+    def write_rows(self, rows, deduplicator=None):
+        """
+        :param rows: chunk of mapped records values
+        :type rows: list
+        :param deduplicator: shared between chunks of one load,
+            new one made if missing
+        """
+        if deduplicator is None:
+            deduplicator = self.make_deduplicator()
+
+        for data in self.resolve_items(self.drop_duplicates(rows,
+                                                            deduplicator)):
+            get_or_create(self.model, data,
+                          using=self.using, read_using=self.read_using)
+        # one batch signal per chunk in bulk signals mode
+        signals.send_changes()
+
+    def make_deduplicator(self):
+        if self.dedupe is None:
+            return None
+        options = dict(self.dedupe)
+        options.pop('key', None)
+        return RecordDeduplicator(**options)
+
+    def get_dedupe_key(self, values):
+        return tuple(values[index] for index in self.dedupe_key)
+
+    def drop_duplicates(self, items, deduplicator, get_key=None):
+        """
+        Items of chunk which keys are not seen by deduplicator.
+        Bloom filter positives kept, `get_or_create` verifies them.
+        :param get_key: dedupe key of item, `get_dedupe_key` of item
+            as record values if None
+        """
+        if deduplicator is None:
+            return items
+
+        get_key = get_key or self.get_dedupe_key
+        kept = []
+        for item in items:
+            if deduplicator.check(get_key(item)) != deduplicator.DUPLICATE:
+                kept.append(item)
+        return kept
+
+    def write_links(self, links, deduplicator=None):
+        """
+        :param links: chunk of (record values, links) pairs
+        :type links: list
+        :param deduplicator: shared between chunks of one load,
+            new one made if missing
+        """
+        if deduplicator is None:
+            deduplicator = self.make_deduplicator()
+        # repeated record with other rels keeps its links
+        links = self.drop_duplicates(
+            links, deduplicator,
+            lambda link: (self.get_dedupe_key(link[0]), link[1])
+        )
+
+        rights = []
+        for index, field in enumerate(self.fields_m2m):
+            rights.append(field.resolve_column(
+                [item_links[index][0] for _, item_links in links]
+            ))
+
+        lefts = self.resolve_items([values for values, _ in links])
+        for data, (values, item_links) in zip(lefts, links):
+            # instances just written, so read them from write database
+            left_instances = self.model._default_manager.using(
+                self.using or router.db_for_write(self.model)
+            ).filter(**data)
             for left_instance in left_instances:
-                for field in self.fields_m2m:
-                    right_instance = field.parse(raw_data)
+                for field, right, (value, through_values) in zip(
+                        self.fields_m2m, rights, item_links):
+                    if right is None:
+                        right_instance = field.resolve(value)
+                    else:
+                        right_instance = right[value]
                     if field.through_model:
-                        through = field.get_through_instance(raw_data)
-                        setattr(through, field.left_field, left_instance)
-                        setattr(through, field.right_field, right_instance)
-                        through.save()
+                        # lookup existing link, so reloading is idempotent
+                        through = field.resolve_through(through_values)
+                        through[field.left_field] = left_instance
+                        through[field.right_field] = right_instance
+                        get_or_create(field.through_model, through,
+                                      using=field.using,
+                                      read_using=field.read_using)
                     else:
-                        right_manager = getattr(left_instance, field.field)
+                        right_manager = getattr(left_instance, field.name)
                         right_manager.add(right_instance)
+                        signals.record_change(right_manager.through,
+                                              left_instance.pk,
+                                              signals.LINKED,
+                                              left_instance._state.db)
+        # one batch signal per chunk in bulk signals mode
+        signals.send_changes()
 
     def get_source_iterator(self, source, query):
         raise NotImplementedError
 
+    def get_attnames(self):
+        return tuple(self.model._meta.get_field(name).attname
+                     for name in self.field_names)
+
+    def reconcile_items(self, items, apply=False, max_items=100000,
+                        batch_size=500):
+        """
+        Classify records against existing table by merge join of
+        records sorted by natural key and table rows ordered by it.
+        :param apply: insert new and update changed records
+        :param max_items: records sorted in memory, rest spilled to disk
+        :return: count of records by status of `reconcile` module
+        """
+        key = self.key or tuple(range(len(self.field_names)))
+        for index in key:
+            if self.fields[index].rel_to:
+                raise ValueError('{name} is relation, natural key must '
+                                 'contain plain fields only'.format(
+                                     name=self.field_names[index]))
+
+        attnames = self.get_attnames()
+        key_attnames = [attnames[index] for index in key]
+        model_fields = [self.model._meta.get_field(name)
+                        for name in self.field_names]
+
+        def get_key(values):
+            # hooked feed values and database values of one type,
+            # so they sort and compare together
+            return tuple(model_fields[index].to_python(values[index])
+                         for index in key)
+
+        feed = external_sort(
+            imap(lambda values: (get_key(values), values),
+                 imap(self.get_item_values, items)),
+            key=itemgetter(0),
+            max_items=max_items
+        )
+        manager = self.model._default_manager
+        rows = manager.using(self.read_using or self.using).order_by(
+            *key_attnames
+        ).values_list('pk', *attnames).iterator()
+        table = ((get_key(row[1:]), row) for row in rows)
+
+        lookups = {}
+
+        def lookup(index, value):
+            field = self.fields[index]
+            if not field.rel_to:
+                return model_fields[index].to_python(value)
+            if (index, value) not in lookups:
+                instance = field.lookup(value)
+                lookups[index, value] = instance and instance.pk
+            return lookups[index, value]
+
+        def get_changes(values, row):
+            changes = {}
+            for index, value in enumerate(values):
+                if lookup(index, value) != row[index + 1]:
+                    changes[self.field_names[index]] = value
+            return changes
+
+        counts = dict.fromkeys((reconcile.INSERT, reconcile.UPDATE,
+                                reconcile.UNCHANGED, reconcile.MISSING), 0)
+        inserts = []
+        last_insert = None
+        write = manager.db_manager(self.using)
+        for status, item_key, values, row in reconcile.merge_join(
+                feed, table, lambda values, row: not get_changes(values, row)):
+            counts[status] += 1
+            if not apply:
+                continue
+
+            if status == reconcile.INSERT and item_key != last_insert:
+                last_insert = item_key
+                inserts.append(self.model(**self.resolve_item(values)))
+                if len(inserts) >= batch_size:
+                    self.bulk_insert(write, inserts, key_attnames)
+                    inserts = []
+            elif status == reconcile.UPDATE:
+                changes = get_changes(values, row)
+                changes = dict(
+                    (name, field.resolve(changes[name]))
+                    for name, field in zip(self.field_names, self.fields)
+                    if name in changes
+                )
+                write.filter(pk=row[0]).update(**changes)
+                # update sends no save signals
+                signals.record_change(self.model, row[0], signals.UPDATED,
+                                      write.db)
+
+        if inserts:
+            self.bulk_insert(write, inserts, key_attnames)
+        return counts
+
+    def bulk_insert(self, manager, instances, key_attnames):
+        """
+        Insert new records by one query and record them as created.
+        Rows selected back by natural key, when database returns no
+        primary keys of bulk insert.
+        """
+        manager.bulk_create(instances)
+        pks = [instance.pk for instance in instances]
+        if None in pks:
+            pks = []
+            # one condition per key field of every instance
+            size = max((get_max_params(manager.db) or 500) //
+                       len(key_attnames), 1)
+            for start in xrange(0, len(instances), size):
+                lookup = reduce(or_, [
+                    Q(**dict((attname, getattr(instance, attname))
+                             for attname in key_attnames))
+                    for instance in instances[start:start + size]
+                ])
+                pks.extend(manager.filter(lookup).values_list('pk',
+                                                              flat=True))
+        for pk in pks:
+            signals.record_change(self.model, pk, signals.CREATED,
+                                  manager.db)
+
+    def get_dependencies(self):
+        """
+        Models which instances this parser look up or create
+        """
+        models = set(field.rel_to for field in self.fields if field.rel_to)
+        for field in self.fields_m2m:
+            models.add(field.right_model)
+            if field.through_model:
+                models.add(field.through_model)
+        models.discard(self.model)
+        return models
+
+    @property
+    def label(self):
+        return '{app_label}.{model}'.format(
+            app_label=self.model._meta.app_label,
+            model=self.model._meta.object_name
+        )
+
+    def get_item_values(self, raw_data):
+        """
+        Mapped record as tuple ordered by `field_names`, without
+        database access
+        """
+        return tuple(field.get_value(raw_data) for field in self.fields)
+
+    def resolve_item(self, values):
+        return dict(zip(self.field_names,
+                        [field.resolve(value)
+                         for field, value in zip(self.fields, values)]))
+
+    def resolve_items(self, rows):
+        """
+        Resolve chunk of records column by column, every related
+        value looked up once per chunk
+        :param rows: list of records values
+        :return: list of dicts for database
+        """
+        columns = zip(*rows)
+        resolved = []
+        for field, column in zip(self.fields, columns):
+            if field.rel_to and field.rel_to_field:
+                cache = field.resolve_column(column)
+                if cache is None:
+                    column = map(field.resolve, column)
+                else:
+                    column = [cache[value] for value in column]
+            resolved.append(column)
+        return [dict(zip(self.field_names, values))
+                for values in zip(*resolved)]
+
     def get_item_data(self, raw_data):
-        return {field.name: field.parse(raw_data) for field in self.fields}
+        return self.resolve_item(self.get_item_values(raw_data))
+
+    def preview_item(self, values, links):
+        """
+        Mapped record with existing related instances, without writes.
+        None target means load would create it.
+        :param values: result of `get_item_values`
+        :param links: result of `get_item_links`
+        """
+        related = {}
+        for field, value in zip(self.fields, values):
+            if field.rel_to and field.rel_to_field:
+                related[field.name] = field.lookup(value)
+
+        rels = {}
+        for field, (value, through_values) in zip(self.fields_m2m, links):
+            rels[field.name] = {
+                'value': value,
+                'target': field.lookup(value),
+                'through': dict(zip([through_field.name for through_field
+                                     in field.through_parsers],
+                                    through_values))
+            }
+        return {'values': dict(zip(self.field_names, values)),
+                'related': related,
+                'rels': rels}
 
 
 class BaseMapperBackend(object):
     parser_cls = BaseModelParser
+    exporter_cls = None
+    # stage name, model parser method applied to dispatched records
+    stages = (
+        ('parse', 'flush_rows'),
+        ('parse_m2m', 'flush_links'),
+    )
+    chunk_size = 1000
+    # compiled schemas kept by backend instance
+    parsers_cache_size = 16
 
-    def __init__(self):
+    def __init__(self, workers=1, spill_memory=None, spill_directory=None):
         self.source = None
         self.parsers = None
+        self.parsers_cache = OrderedDict()
+        # defaults of loads, override by `load` arguments
+        self.workers = workers
+        self.bulk_signals = False
+        self.bulk_session = False
+        # options of current load, instance is reused by next loads
+        self.load_options = self.get_load_options()
+        # active BulkSession of load, worker threads attach to it
+        self.session = None
+        # mapper.utils.cache.RelatedCache of long running process
+        self.related_cache = None
+        # (minimum, maximum) of write chunk size, settings by default
+        self.chunk_bounds = None
+        # label -> parser method -> chunks report of last load
+        self.report = {}
+        self.spill_memory = spill_memory or getattr(
+            settings, 'MAPPER_SPILL_MEMORY', mapper_settings.SPILL_MEMORY
+        )
+        self.spill_directory = spill_directory or getattr(
+            settings, 'MAPPER_SPILL_DIRECTORY', None
+        )
 
-    def load(self, file_name, options):
+    def load(self, file_name, options, workers=None, using=None,
+             read_using=None, bulk_signals=None, bulk_session=None):
         """
         :param file_name: full name of source file
         :type file_name: basestring
+        :param workers: number of parsers run concurrently in stage,
+            parsers of independent models only
+        :type workers: int
+        :param using: write database alias for all models or dict
+            of aliases by model label, override schema 'using' key
+        :type using: basestring or dict
+        :param read_using: database alias for existence lookups,
+            the same format as `using`
+        :type read_using: basestring or dict
+        :param bulk_signals: suppress per instance save and m2m signals
+            of load threads, send `mapper.signals.bulk_changed` per chunk
+            and model instead
+        :type bulk_signals: bool
+        :param bulk_session: fast, not durable write settings of
+            databases during load, see `mapper.utils.session.BulkSession`
+        :type bulk_session: bool
         :param options: parsing info grouped by model, for example
         ['mapper.Event': {  # app_label.model_name
                             # for model description
             'query': 'channel.events',  # query to instance data
                                         # build through divider '.'
+            'key': ['title'],  # optional, fields of natural key
+                               # used by reconcile and dedupe
+            'dedupe': {  # optional, skip repeated records of feed,
+                         # True for key of all fields
+                'key': ['title'],  # natural key, if differ from 'key'
+                'exact_limit': 100000,  # exact set size, after that
+                                        # Bloom filter used
+                'capacity': 10 ** 8,  # expected records of Bloom filter
+                'error_rate': 0.001  # false positive rate, positives
+                                     # verified in database
+            },
+            'using': 'default',  # optional, write database alias
+            'read_using': 'replica',  # optional, database alias
+                                      # for existence lookups
             'fields': {    # plain fields description
                            # contain model_field: query in simple case
                            # contain model_field: dict in other case
@@ -519,16 +1293,201 @@ class BaseMapperBackend(object):
         },
         ...]
         :type options: dict
-        :return:
+        :return: model label -> parser method -> report of chunk sizes
+            chosen by `mapper.utils.chunks.ChunkController`
         """
+        self.prepare(options, workers, using, read_using, bulk_signals,
+                     bulk_session)
         self.source = self.load_source(file_name)
-        self.parsers = self.load_parsers(options)
 
+        try:
+            self.run_session(self.source)
+        finally:
+            # backend instances live per process, don't keep document
+            self.source = None
+        return self.report
+
+    def reconcile(self, file_name, options, apply=False, max_items=100000,
+                  using=None, read_using=None):
+        """
+        Full sync mode: classify every mapped record as insert, update,
+        unchanged or missing from feed by natural key ('key' option of
+        schema) in one sequential pass over table. M2M rels not synced,
+        inserted and updated rows sent by `mapper.signals.bulk_changed`.
+        :param apply: write inserts and updates
+        :param max_items: records sorted in memory, rest spilled to disk
+        :return: model label -> counts by status
+        """
+        self.prepare(options, using=using, read_using=read_using)
+        self.source = self.load_source(file_name)
+        try:
+            records = self.dispatch_records(self.source, self.parsers)
+            report = {}
+            for level in self.get_parser_levels(self.parsers):
+                for parser in level:
+                    # updated rows sent by `mapper.signals.bulk_changed`
+                    with signals.collect_changes():
+                        report[parser.label] = parser.reconcile_items(
+                            records[parser], apply=apply,
+                            max_items=max_items
+                        )
+            return report
+        finally:
+            self.source = None
+
+    def preview(self, file_name, options, limit=10, sample=False,
+                using=None, read_using=None, seed=None):
+        """
+        Map first `limit` records of every model, or reservoir sample
+        of them over whole source, without writes. Source streamed and
+        reading stopped as soon as first records found.
+        :param sample: uniform sample instead of first records
+        :param seed: seed of sample, for repeatable preview
+        :return: model label -> list of `BaseModelParser.preview_item`
+        """
+        self.prepare(options, using=using, read_using=read_using)
+        records = self.iter_preview_records(file_name, self.parsers)
+        try:
+            mapped = self.sample_records(records, self.parsers, limit,
+                                         sample, random.Random(seed))
+        finally:
+            records.close()
+
+        return dict((parser.label, [parser.preview_item(values, links)
+                                    for values, links in mapped[parser]])
+                    for parser in self.parsers)
+
+    def iter_preview_records(self, file_name, parsers):
+        """
+        Records of source for preview, backends override it for
+        stream source instead of loading it
+        """
+        for raw_data, claimed in self.iter_records(
+                self.load_source(file_name), parsers):
+            yield raw_data, claimed
+
+    @staticmethod
+    def sample_records(records, parsers, limit, sample=False, rand=None):
+        """
+        Mapped values and links of first `limit` records of every
+        parser, or of reservoir sample. Records mapped when taken,
+        so raw records are not kept.
+        :return: parser -> list of (values, links)
+        """
+        rand = rand or random.Random()
+        taken = dict((parser, []) for parser in parsers)
+        seen = dict.fromkeys(parsers, 0)
+        full = set()
+        for raw_data, claimed in records:
+            for parser in claimed:
+                seen[parser] += 1
+                items = taken[parser]
+                if len(items) < limit:
+                    items.append((parser.get_item_values(raw_data),
+                                  parser.get_item_links(raw_data)))
+                    if len(items) == limit:
+                        full.add(parser)
+                elif sample:
+                    index = rand.randint(0, seen[parser] - 1)
+                    if index < limit:
+                        items[index] = (parser.get_item_values(raw_data),
+                                        parser.get_item_links(raw_data))
+
+            if not sample and len(full) == len(parsers):
+                break
+        return taken
+
+    def export(self, file_name, options, root=None, chunk_size=None,
+               using=None):
+        """
+        Write rows of schema models into file, reverse of `load`.
+        Hooks not reversible, so 'export_hook' of field used if set.
+        :param root: root tag of document
+        :param chunk_size: rows read by one query
+        :param using: database alias to read from
+        """
+        if self.exporter_cls is None:
+            raise NotImplementedError('backend not support export')
+
+        self.prepare(options, read_using=using)
+        exporter = self.exporter_cls(self.parsers, chunk_size)
+        exporter.export(file_name, root)
+
+    def prepare(self, options, workers=None, using=None, read_using=None,
+                bulk_signals=None, bulk_session=None):
+        self.load_options = self.get_load_options(
+            workers=workers, bulk_signals=bulk_signals,
+            bulk_session=bulk_session
+        )
+        self.report = {}
+        self.parsers = self.load_parsers(options)
         for parser in self.parsers:
-            parser.parse(self.source)
+            parser.set_database(
+                self.get_alias(using, parser, parser.schema_using),
+                self.get_alias(read_using, parser, parser.schema_read_using)
+            )
+            parser.set_cache(self.related_cache)
+            parser.clear_interned()
+
+    def get_load_options(self, **options):
+        """
+        Options of one load, missing ones taken from instance defaults
+        """
+        defaults = {'workers': self.workers,
+                    'bulk_signals': self.bulk_signals,
+                    'bulk_session': self.bulk_session}
+        for name, value in options.items():
+            if value is not None:
+                defaults[name] = value
+        return defaults
 
+    @staticmethod
+    def get_alias(alias, parser, default=None):
+        if isinstance(alias, dict):
+            return alias.get(parser.label, default)
+        return default if alias is None else alias
+
+    def run_session(self, source):
+        """
+        Process source, within bulk session if it on
+        """
+        if not self.load_options['bulk_session']:
+            return self.process(source)
+        with BulkSession(self.get_write_aliases()) as session:
+            self.session = session
+            try:
+                return self.process(source)
+            finally:
+                self.session = None
+
+    def get_write_aliases(self):
+        aliases = set()
         for parser in self.parsers:
-            parser.parse_m2m(self.source)
+            for model in parser.get_dependencies() | {parser.model}:
+                aliases.add(parser.using or router.db_for_write(model))
+        return aliases
+
+    def process(self, source):
+        """
+        Map records of loaded source into spill store and run all
+        stages, which write store back in chunks
+        """
+        with SpillStore(self.spill_memory, self.spill_directory) as store:
+            # records mapped by chunks, so hooks of column run together
+            pending = dict((parser, []) for parser in self.parsers)
+            for raw_data, claimed in self.iter_records(source, self.parsers):
+                for parser in claimed:
+                    items = pending[parser]
+                    items.append(raw_data)
+                    if len(items) >= self.chunk_size:
+                        parser.map_items(items, store)
+                        pending[parser] = []
+            for parser in self.parsers:
+                if pending[parser]:
+                    parser.map_items(pending[parser], store)
+
+            for stage, method in self.stages:
+                self.run_stage(stage, method, store)
 
     def load_source(self, file_name):
         """
@@ -537,14 +1496,173 @@ class BaseMapperBackend(object):
         """
         raise NotImplementedError
 
+    def run_stage(self, stage, method, store):
+        """
+        :param stage: stage name
+        :param method: name of model parser method
+        :param store: mapped records
+        :type store: mapper.utils.spill.SpillStore
+        """
+        self.run_levels(method, store)
+
+    def run_levels(self, method, store):
+        def run(parser):
+            if self.session is not None:
+                self.session.attach()
+            try:
+                self.run_parser(parser, method, store)
+            finally:
+                if self.session is not None:
+                    self.session.detach()
+                # worker thread has own connections
+                connections.close_all()
+
+        workers = self.load_options['workers']
+        pool = None
+        try:
+            for level in self.get_parser_levels(self.parsers):
+                if workers > 1 and len(level) > 1:
+                    if pool is None:
+                        pool = ThreadPool(workers)
+                    pool.map(run, level)
+                else:
+                    for parser in level:
+                        self.run_parser(parser, method, store)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def run_parser(self, parser, method, store):
+        controller = self.make_chunk_controller(parser, method)
+        if not self.load_options['bulk_signals']:
+            report = getattr(parser, method)(store, controller)
+        else:
+            # signals suppressed per thread, run by worker threads too
+            with signals.collect_changes(), signals.suppress_signals():
+                report = getattr(parser, method)(store, controller)
+        if report is not None:
+            self.report.setdefault(parser.label, {})[method] = report
+        return report
+
+    def make_chunk_controller(self, parser, method):
+        minimum, maximum = self.chunk_bounds or getattr(
+            settings, 'MAPPER_CHUNK_SIZE_BOUNDS',
+            mapper_settings.CHUNK_SIZE_BOUNDS
+        )
+        alias = parser.read_using or parser.using or \
+            router.db_for_read(parser.model)
+        return ChunkController(
+            self.chunk_size, minimum, maximum,
+            latency=getattr(settings, 'MAPPER_CHUNK_LATENCY',
+                            mapper_settings.CHUNK_LATENCY),
+            max_params=get_max_params(alias),
+            params_per_row=parser.get_chunk_params(method)
+        )
+
+    @staticmethod
+    def get_parser_levels(parsers):
+        """
+        Group parsers by dependencies: parsers of every level depend only
+        on parsers of previous levels. Inside level parsers sorted by
+        model label. Parsers of dependency cycle run one by one.
+        Parsers which look up or create instances of the same model
+        never share level, concurrent `get_or_create` makes duplicates.
+        :param parsers: model parsers
+        :type parsers: list
+        :return: list of parsers lists
+        """
+        producers = {}
+        for parser in parsers:
+            producers.setdefault(parser.model, []).append(parser)
+
+        pending = {}
+        targets = {}
+        for parser in parsers:
+            targets[parser] = parser.get_dependencies() | {parser.model}
+            pending[parser] = set(
+                producer
+                for model in parser.get_dependencies()
+                for producer in producers.get(model, ())
+            )
+
+        levels = []
+        while pending:
+            ready = [parser for parser, deps in pending.items() if not deps]
+            if not ready:
+                # cycle, break it by first parser in stable order
+                ready = [min(pending, key=lambda x: x.label)]
+            ready.sort(key=lambda x: x.label)
+
+            # parsers of shared targets wait for next level
+            level = []
+            taken = set()
+            for parser in ready:
+                if not taken & targets[parser]:
+                    level.append(parser)
+                    taken.update(targets[parser])
+
+            for parser in level:
+                del pending[parser]
+            for deps in pending.values():
+                deps.difference_update(level)
+            levels.append(level)
+        return levels
+
+    def dispatch_records(self, source, parsers):
+        """
+        Walk source once and group record items by parser claimed them
+        :param source: loaded source
+        :param parsers: model parsers
+        :type parsers: list
+        :return: parser -> list of raw records
+        :rtype: dict
+        """
+        records = dict((parser, []) for parser in parsers)
+        for raw_data, claimed in self.iter_records(source, parsers):
+            for parser in claimed:
+                records[parser].append(raw_data)
+        return records
+
+    def iter_records(self, source, parsers):
+        """
+        Yield pairs of raw record and parsers which claim it.
+        Default implementation run own query of every parser,
+        backends override it for make single pass over source
+        :param source: loaded source
+        :param parsers: model parsers
+        :type parsers: list
+        """
+        for parser in parsers:
+            for raw_data in parser.get_source_iterator(source, parser.query):
+                yield raw_data, (parser, )
+
     def load_parsers(self, options):
         """
-        :param options: options of mapping
+        :param options: options of mapping, not changed by validation
         :type options: dict
         :return: options
         """
+        try:
+            key = freeze(options)
+        except TypeError:
+            key = None
+
+        if key is not None and key in self.parsers_cache:
+            # last used schemas kept
+            parsers = self.parsers_cache.pop(key)
+            self.parsers_cache[key] = parsers
+            return parsers
+
+        # validators replace names by objects in place
+        options = copy.deepcopy(options)
         parsers = []
         for model, parser_options in options.iteritems():
             parser = self.parser_cls(model, parser_options)
             parsers.append(parser)
-        return parsers
\ No newline at end of file
+
+        if key is not None:
+            self.parsers_cache[key] = parsers
+            if len(self.parsers_cache) > self.parsers_cache_size:
+                self.parsers_cache.popitem(last=False)
+        return parsers
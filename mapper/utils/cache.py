@@ -0,0 +1,148 @@
+import threading
+
+from django.db import router
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete
+
+from .. import signals
+
+
+class CachedValues(dict):
+    """
+    Instances of one related model by lookup value. Shared by job
+    threads, read values by single `get`, writes and counters take
+    lock of `RelatedCache`.
+    """
+
+    def __init__(self, max_size, lock=None):
+        super(CachedValues, self).__init__()
+        self.max_size = max_size
+        self.lock = lock or threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def store(self, found):
+        with self.lock:
+            # bounded by dropping all, values of next feeds come back soon
+            if len(self) + len(found) > self.max_size:
+                self.clear()
+            self.update(found)
+
+    def count(self, hits=0, misses=0):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+
+class RelatedCache(object):
+    """
+    Related instances by lookup value shared by loads of long running
+    process, so values repeated between feeds are not looked up again.
+
+    Changes made in process come by signals: created rows extend
+    expected state of table, updated and deleted rows drop cache of
+    model. `validate` compare count and max primary key of cached
+    tables with expected state, so inserts and deletes of other
+    processes drop cache too. Updates by `QuerySet.update` of other
+    code are not seen, call `invalidate` after them.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        self.caches = {}
+        # (model, alias) -> [count, max pk] expected in table
+        self.states = {}
+        self.connected = False
+
+    @staticmethod
+    def get_alias(model, using=None):
+        return using or router.db_for_write(model)
+
+    def get(self, model, field, using=None):
+        """
+        :return: cache of `model` instances by `field` value
+        :rtype: CachedValues
+        """
+        key = (model, field, self.get_alias(model, using))
+        with self.lock:
+            cache = self.caches.get(key)
+            if cache is None:
+                cache = self.caches[key] = CachedValues(self.max_size,
+                                                         self.lock)
+            return cache
+
+    def get_state(self, model, alias):
+        state = model._default_manager.using(alias).aggregate(
+            count=Count('pk'), last=Max('pk')
+        )
+        return [state['count'], state['last']]
+
+    def validate(self):
+        """
+        Drop caches of tables changed outside of process
+        """
+        with self.lock:
+            tables = set((model, alias) for model, _, alias in self.caches)
+            for model, alias in tables:
+                state = self.get_state(model, alias)
+                if self.states.get((model, alias), state) != state:
+                    self.invalidate(model, alias)
+                self.states[model, alias] = state
+
+    def invalidate(self, model=None, using=None):
+        """
+        Drop cached instances of model, all models if missing
+        """
+        with self.lock:
+            for key, cache in self.caches.items():
+                if model is not None and key[0] is not model:
+                    continue
+                if using is not None and key[2] != using:
+                    continue
+                cache.clear()
+                self.states.pop(key[::2], None)
+
+    def record_created(self, model, pks, using):
+        state = self.states.get((model, using))
+        if state is None:
+            return
+        with self.lock:
+            state[0] += len(pks)
+            state[1] = max([state[1]] + list(pks))
+
+    def on_save(self, sender, instance, created, using, **kwargs):
+        if created:
+            self.record_created(sender, (instance.pk, ), using)
+        else:
+            self.invalidate(sender, using)
+
+    def on_delete(self, sender, using, **kwargs):
+        self.invalidate(sender, using)
+
+    def on_bulk_changed(self, sender, pks, operation, using, **kwargs):
+        if operation == signals.CREATED:
+            self.record_created(sender, pks, using)
+        elif operation == signals.UPDATED:
+            self.invalidate(sender, using)
+
+    def connect(self):
+        if not self.connected:
+            post_save.connect(self.on_save)
+            post_delete.connect(self.on_delete)
+            signals.bulk_changed.connect(self.on_bulk_changed)
+            self.connected = True
+
+    def disconnect(self):
+        if self.connected:
+            post_save.disconnect(self.on_save)
+            post_delete.disconnect(self.on_delete)
+            signals.bulk_changed.disconnect(self.on_bulk_changed)
+            self.connected = False
+
+    def get_stats(self):
+        with self.lock:
+            caches = self.caches.values()
+            return {'size': sum(len(cache) for cache in caches),
+                    'hits': sum(cache.hits for cache in caches),
+                    'misses': sum(cache.misses for cache in caches)}
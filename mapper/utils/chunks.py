@@ -0,0 +1,117 @@
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .. import settings as mapper_settings
+
+
+def get_max_params(alias):
+    """
+    Parameters allowed in one query of database, None if unknown
+    """
+    connection = connections[alias]
+    limits = getattr(settings, 'MAPPER_MAX_QUERY_PARAMS',
+                     mapper_settings.MAX_QUERY_PARAMS)
+    limit = limits.get(connection.vendor)
+    in_list = connection.ops.max_in_list_size()
+    if in_list is not None:
+        limit = min(limit or in_list, in_list)
+    return limit
+
+
+class ChunkController(object):
+    """
+    Feedback control of write chunk size. Size goes on in the same
+    direction while throughput of full chunks grows and turns back
+    when it falls, chunks slower than `latency` seconds shrink, so
+    long transactions don't hold locks of concurrent writers. Size
+    kept within bounds, and rows of chunk within `max_params` of
+    database for queries which take parameter by every row.
+    """
+    growth = 2.0
+    # throughput changes less than that are noise
+    tolerance = 0.05
+
+    def __init__(self, size=1000, minimum=1, maximum=10000, latency=2.0,
+                 max_params=None, params_per_row=0):
+        if max_params and params_per_row:
+            maximum = min(maximum, max(max_params // params_per_row, 1))
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.latency = latency
+        self.params_per_row = params_per_row
+        self.size = self.clamp(size)
+        self.direction = 1
+        self.rate = None
+        # (size, rows, elapsed, params) of every chunk
+        self.chunks = []
+
+    def clamp(self, size):
+        return int(min(max(size, self.minimum), self.maximum))
+
+    def record(self, rows, elapsed):
+        """
+        Feed measurement of written chunk
+        :return: size of next chunk
+        """
+        self.chunks.append((self.size, rows, elapsed,
+                            rows * self.params_per_row))
+        # partial last chunk says nothing about size
+        if rows < self.size:
+            return self.size
+
+        rate = rows / max(elapsed, 1e-6)
+        if elapsed > self.latency:
+            self.direction = -1
+            self.size = self.clamp(self.size * self.latency / elapsed)
+        else:
+            if self.rate is not None and \
+                    rate < self.rate * (1 - self.tolerance):
+                self.direction = -self.direction
+            factor = self.growth if self.direction > 0 else 1 / self.growth
+            self.size = self.clamp(self.size * factor)
+        self.rate = rate
+        return self.size
+
+    def iter_chunks(self, items):
+        """
+        Chunks of items, size of every chunk taken when it started
+        """
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= self.size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def write(self, items, write):
+        """
+        :param write: called with every chunk, measured
+        :return: report of chosen sizes
+        """
+        for chunk in self.iter_chunks(items):
+            started = time.time()
+            write(chunk)
+            self.record(len(chunk), time.time() - started)
+        return self.get_report()
+
+    def get_report(self):
+        rows = sum(chunk[1] for chunk in self.chunks)
+        elapsed = sum(chunk[2] for chunk in self.chunks)
+        # consecutive chunks of one size as [size, chunks]
+        sizes = []
+        for chunk in self.chunks:
+            if sizes and sizes[-1][0] == chunk[0]:
+                sizes[-1][1] += 1
+            else:
+                sizes.append([chunk[0], 1])
+        return {'chunks': len(self.chunks),
+                'rows': rows,
+                'elapsed': elapsed,
+                'rows_per_second': rows / elapsed if elapsed else None,
+                'params': max([chunk[3] for chunk in self.chunks] or [0]),
+                'bounds': (self.minimum, self.maximum),
+                'sizes': sizes}
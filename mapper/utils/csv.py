@@ -0,0 +1,187 @@
+from __future__ import absolute_import
+
+import csv
+
+from ..utils.base import BaseModelParser
+from ..utils.base import BaseFieldParser
+from ..utils.base import BaseMapperBackend
+from ..utils.base import BaseFieldValidator
+from ..utils.base import BaseManyToManyValidator
+from ..utils.base import BaseManyToManyParseField
+from ..utils.base import iter_chunks
+from ..utils.spill import SpillStore
+
+
+class CsvSource(object):
+    """
+    Streaming reader of delimited file, rows read by chunks
+    through large file buffer, so memory not depend on file size
+    """
+
+    def __init__(self, file_name, delimiter=',', encoding='utf-8',
+                 has_header=True, buffer_size=1024 * 1024):
+        self.file_name = file_name
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.has_header = has_header
+        self.buffer_size = buffer_size
+        self.header = ()
+        if has_header:
+            with open(file_name, 'rb') as source:
+                header = next(self.make_reader(source), ())
+            self.header = tuple(name.decode(encoding).strip()
+                                for name in header)
+
+    def make_reader(self, source):
+        return csv.reader(source, delimiter=self.delimiter)
+
+    def __iter__(self):
+        with open(self.file_name, 'rb', self.buffer_size) as source:
+            reader = self.make_reader(source)
+            if self.has_header:
+                next(reader, None)
+            for row in reader:
+                yield row
+
+    def iter_chunks(self, size):
+        return iter_chunks(self, size)
+
+
+class CsvHelper(object):
+
+    @staticmethod
+    def get_column(query, header):
+        """
+        Index of column by query: column name or index
+        """
+        if isinstance(query, (int, long)):
+            return query
+        if query.isdigit():
+            return int(query)
+        try:
+            return list(header).index(query)
+        except ValueError:
+            raise ValueError('column {query} not found in header'.format(
+                query=query
+            ))
+
+
+class CsvFieldValidator(BaseFieldValidator):
+
+    @classmethod
+    def validate(cls, options):
+        if isinstance(options, (int, long)):
+            options = {'query': options}
+        return super(CsvFieldValidator, cls).validate(options)
+
+
+class CsvManyToManyValidator(BaseManyToManyValidator):
+    plain_validator_cls = CsvFieldValidator
+
+
+class CsvFieldMixin(object):
+    __slots__ = ()
+
+    def bind(self, source):
+        self.column = CsvHelper.get_column(self.query, source.header)
+        self.encoding = source.encoding
+
+    def get_raw_value(self, raw_data, query):
+        value = raw_data[self.column] if self.column < len(raw_data) else ''
+        return [value.decode(self.encoding)] if value else []
+
+    def get_values(self, rows):
+        """
+        Values of column for chunk of rows, hook applied once
+        for every distinct value
+        """
+        raw = []
+        for row in rows:
+            value = row[self.column] if self.column < len(row) else ''
+            if not value:
+                raise self.ParseNotFound(self.model, self.name, row,
+                                         self.query)
+            raw.append(value)
+
+        distinct = list(set(raw))
+        results = self.apply_hook([value.decode(self.encoding)
+                                   for value in distinct])
+        decoded = dict(zip(distinct, map(self.intern, results)))
+        return [decoded[value] for value in raw]
+
+
+class CsvFieldParser(CsvFieldMixin, BaseFieldParser):
+    __slots__ = ('column', 'encoding')
+    validator = CsvFieldValidator
+
+
+class CsvManyToManyFieldParser(CsvFieldMixin, BaseManyToManyParseField):
+    __slots__ = ('column', 'encoding')
+    validator = CsvManyToManyValidator
+    field_parser_cls = CsvFieldParser
+
+    def bind(self, source):
+        super(CsvManyToManyFieldParser, self).bind(source)
+        for field in self.through_parsers:
+            field.bind(source)
+
+
+class CsvModelParser(BaseModelParser):
+    """
+    Every row of file is record for every model of schema,
+    so model 'query' is optional. Field 'query' is column name
+    or index.
+    """
+    __slots__ = ()
+    field_parser_cls = CsvFieldParser
+    field_parser_m2m_cls = CsvManyToManyFieldParser
+
+    @classmethod
+    def validate_query(cls, options):
+        return options.get('query', '*')
+
+    def bind(self, source):
+        for field in self.fields:
+            field.bind(source)
+        for field in self.fields_m2m:
+            field.bind(source)
+
+    def get_source_iterator(self, source, query):
+        self.bind(source)
+        return iter(source)
+
+
+class CsvMapperBackend(BaseMapperBackend):
+    parser_cls = CsvModelParser
+    delimiter = ','
+    encoding = 'utf-8'
+    has_header = True
+    buffer_size = 1024 * 1024
+
+    def load_source(self, file_name):
+        return CsvSource(file_name, delimiter=self.delimiter,
+                         encoding=self.encoding, has_header=self.has_header,
+                         buffer_size=self.buffer_size)
+
+    def iter_preview_records(self, file_name, parsers):
+        source = self.load_source(file_name)
+        for parser in parsers:
+            parser.bind(source)
+        for row in source:
+            yield row, parsers
+
+    def process(self, source):
+        for parser in self.parsers:
+            parser.bind(source)
+
+        with SpillStore(self.spill_memory, self.spill_directory) as store:
+            for rows in source.iter_chunks(self.chunk_size):
+                for parser in self.parsers:
+                    parser.map_items(rows, store)
+
+            for stage, method in self.stages:
+                self.run_stage(stage, method, store)
+
+
+class TsvMapperBackend(CsvMapperBackend):
+    delimiter = '\t'
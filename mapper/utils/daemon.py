@@ -0,0 +1,281 @@
+from __future__ import absolute_import
+
+import glob
+import itertools
+import json
+import os
+import Queue
+import SocketServer
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from . import load_backend
+from .cache import RelatedCache
+
+
+class Job(object):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    # load arguments accepted from job description
+    options = ('workers', 'using', 'read_using', 'bulk_signals',
+               'bulk_session')
+
+    def __init__(self, number, file_name, schema, backend=None, **options):
+        unknown = set(options) - set(self.options)
+        if unknown:
+            raise ValueError('unknown job options: {}'.format(
+                ', '.join(sorted(unknown))
+            ))
+
+        self.id = number
+        self.file_name = file_name
+        self.schema = schema
+        self.backend = backend
+        self.load_options = options
+        self.status = self.QUEUED
+        self.error = None
+        # chunk sizes report of load
+        self.report = None
+        self.queued = time.time()
+        self.started = self.finished = None
+        self.done = threading.Event()
+        # called with job when finished, spool mode marks job file
+        self.callback = None
+
+    def get_stats(self):
+        stats = {'id': self.id, 'file_name': self.file_name,
+                 'schema': self.schema, 'backend': self.backend,
+                 'status': self.status, 'error': self.error,
+                 'queued': self.queued, 'started': self.started,
+                 'finished': self.finished, 'wait': None, 'elapsed': None,
+                 'report': self.report}
+        if self.started is not None:
+            stats['wait'] = self.started - self.queued
+        if self.finished is not None:
+            stats['elapsed'] = self.finished - self.started
+        return stats
+
+
+class ImportDaemon(object):
+    """
+    Resident loader: jobs come from spool directory or Unix socket
+    and run by `max_jobs` threads. Threads keep their backend
+    instances with compiled parsers and database connections, related
+    instances shared by `RelatedCache`, so frequent small feeds skip
+    warming up.
+
+    Spool: job is JSON file '<name>.job' with 'file_name', 'schema'
+    (dotted path to schema dict) and optional 'backend', 'workers',
+    'using', 'read_using', 'bulk_signals', 'bulk_session'. Claimed
+    job renamed to '<name>.running', then replaced by '<name>.done'
+    or '<name>.failed' with job stats.
+
+    Socket: one JSON line per connection, job description as above
+    answered by job stats, with "wait": true after job finished.
+    {"command": "stats"} answered by stats of all jobs and cache.
+    """
+    job_suffix = '.job'
+
+    def __init__(self, max_jobs=2, spool=None, socket_path=None,
+                 interval=1.0, backend=None, cache_size=100000,
+                 history=100, log=None):
+        self.max_jobs = max_jobs
+        self.spool = spool
+        self.socket_path = socket_path
+        self.interval = interval
+        self.backend = backend
+        self.history = history
+        self.log = log or (lambda message: None)
+
+        self.cache = RelatedCache(cache_size)
+        self.queue = Queue.Queue()
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.counter = itertools.count(1)
+        self.threads = []
+        self.server = None
+        self.stopped = threading.Event()
+
+    def submit(self, file_name, schema, backend=None, callback=None,
+               **options):
+        """
+        :param schema: dotted path to mapping schema dict
+        :param callback: called with job when finished
+        :rtype: Job
+        """
+        job = Job(next(self.counter), file_name, schema,
+                  backend or self.backend, **options)
+        job.callback = callback
+        with self.lock:
+            self.jobs[job.id] = job
+            self.trim_history()
+        self.queue.put(job)
+        return job
+
+    def trim_history(self):
+        finished = [number for number, job in self.jobs.items()
+                    if job.done.is_set()]
+        for number in finished[:max(len(finished) - self.history, 0)]:
+            del self.jobs[number]
+
+    def run_job(self, job):
+        job.status = job.RUNNING
+        job.started = time.time()
+        # reuse open connections, replace broken or expired ones
+        close_old_connections()
+        try:
+            backend = load_backend(job.backend)
+            backend.related_cache = self.cache
+            self.cache.validate()
+            job.report = backend.load(job.file_name,
+                                      import_string(job.schema),
+                                      **job.load_options)
+        except Exception as e:
+            job.status = job.FAILED
+            job.error = u'{}: {}'.format(type(e).__name__, e)
+        else:
+            job.status = job.DONE
+        finally:
+            job.finished = time.time()
+            close_old_connections()
+
+        self.log(u'job {0.id} {0.status}: {0.file_name}, '
+                 u'{elapsed:.2f}s'.format(job, elapsed=job.finished -
+                                          job.started))
+        try:
+            if job.callback is not None:
+                job.callback(job)
+        except Exception as e:
+            # keep worker alive, waiting clients get stats anyway
+            self.log(u'job {0.id} callback failed: {1}: {2}'.format(
+                job, type(e).__name__, e))
+        finally:
+            job.done.set()
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            self.run_job(job)
+
+    def get_stats(self):
+        with self.lock:
+            jobs = [job.get_stats() for job in self.jobs.values()]
+        return {'jobs': jobs, 'cache': self.cache.get_stats(),
+                'queued': self.queue.qsize()}
+
+    def scan_spool(self):
+        """
+        Claim and submit new job files of spool directory
+        """
+        pattern = os.path.join(self.spool, '*' + self.job_suffix)
+        for path in sorted(glob.glob(pattern)):
+            name = path[:-len(self.job_suffix)]
+            try:
+                os.rename(path, name + '.running')
+            except OSError:
+                # claimed by another daemon
+                continue
+
+            try:
+                with open(name + '.running') as description:
+                    options = json.load(description)
+                options['file_name'] = os.path.join(self.spool,
+                                                    options['file_name'])
+                options['callback'] = lambda job, name=name: \
+                    self.write_result(name, job.get_stats())
+                self.submit(**options)
+            except (ValueError, KeyError, TypeError) as e:
+                self.write_result(name, {'status': Job.FAILED,
+                                         'error': u'{}: {}'.format(
+                                             type(e).__name__, e)})
+
+    @staticmethod
+    def write_result(name, stats):
+        with open('{}.{}'.format(name, stats['status']), 'w') as result:
+            json.dump(stats, result)
+        os.remove(name + '.running')
+
+    def handle_request(self, request):
+        if request.get('command') == 'stats':
+            return self.get_stats()
+
+        wait = request.pop('wait', False)
+        request.pop('callback', None)
+        job = self.submit(**request)
+        if wait:
+            job.done.wait()
+        return job.get_stats()
+
+    def start(self):
+        self.cache.connect()
+        for _ in xrange(self.max_jobs):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+        if self.socket_path:
+            self.server = MapperSocketServer(self.socket_path, self)
+            thread = threading.Thread(target=self.server.serve_forever)
+            thread.daemon = True
+            thread.start()
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while not self.stopped.is_set():
+                if self.spool:
+                    self.scan_spool()
+                self.stopped.wait(self.interval)
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stop accepting jobs, wait for queued and running ones
+        """
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            os.remove(self.socket_path)
+
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.cache.disconnect()
+
+
+class MapperRequestHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            if not isinstance(request, dict):
+                raise ValueError('request must be JSON object')
+            response = self.server.importer.handle_request(request)
+        except (ValueError, KeyError, TypeError) as e:
+            response = {'error': u'{}: {}'.format(type(e).__name__, e)}
+        self.wfile.write(json.dumps(response) + '\n')
+
+
+class MapperSocketServer(SocketServer.ThreadingMixIn,
+                         SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, importer):
+        self.importer = importer
+        SocketServer.UnixStreamServer.__init__(self, socket_path,
+                                               MapperRequestHandler)
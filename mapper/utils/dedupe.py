@@ -0,0 +1,100 @@
+import math
+from hashlib import md5
+from struct import unpack
+
+
+class BloomFilter(object):
+    """
+    Probabilistic set of keys with bounded memory.
+    False positives are possible with `error_rate` probability,
+    false negatives are not.
+    """
+
+    def __init__(self, capacity, error_rate):
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be in range (0, 1)')
+
+        self.size = int(math.ceil(
+            -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        ))
+        self.hashes = max(1, int(round(
+            self.size / float(capacity) * math.log(2)
+        )))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def get_positions(self, digest):
+        # double hashing by two halves of digest
+        first, second = unpack('<QQ', digest)
+        for number in xrange(self.hashes):
+            yield (first + number * second) % self.size
+
+    def add(self, digest):
+        """
+        :return: True if digest may be added before
+        """
+        present = True
+        for position in self.get_positions(digest):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                present = False
+                self.bits[byte] |= 1 << bit
+        return present
+
+    def __contains__(self, digest):
+        for position in self.get_positions(digest):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                return False
+        return True
+
+
+class RecordDeduplicator(object):
+    """
+    Detect repeated records of feed by key.
+    Exact set of key digests used up to `exact_limit` records,
+    after that Bloom filter, which positives must be verified.
+    """
+    NEW = 'new'
+    DUPLICATE = 'duplicate'
+    MAYBE = 'maybe'
+
+    def __init__(self, exact_limit=100000, capacity=10 ** 8,
+                 error_rate=0.001):
+        self.exact_limit = exact_limit
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.exact = set()
+        self.bloom = None
+        self.duplicates = 0
+
+    @staticmethod
+    def get_digest(key):
+        return md5(repr(key)).digest()
+
+    def check(self, key):
+        """
+        Register key and tell if it was seen before
+        :return: NEW, DUPLICATE or MAYBE for Bloom filter positive
+        """
+        digest = self.get_digest(key)
+
+        if self.bloom is None:
+            if digest in self.exact:
+                self.duplicates += 1
+                return self.DUPLICATE
+            self.exact.add(digest)
+            if len(self.exact) > self.exact_limit:
+                self.switch_to_bloom()
+            return self.NEW
+
+        if self.bloom.add(digest):
+            return self.MAYBE
+        return self.NEW
+
+    def switch_to_bloom(self):
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        for digest in self.exact:
+            self.bloom.add(digest)
+        self.exact = set()
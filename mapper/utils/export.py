@@ -0,0 +1,172 @@
+import os
+import sys
+import tempfile
+from operator import itemgetter
+
+
+class BaseExporter(object):
+    """
+    Reverse mapping: write model rows into file by the same schema
+    which used for loading. Rows read by chunks of primary keys,
+    related instances of chunk fetched by one query per relation,
+    so memory not depend on table size.
+    """
+    chunk_size = 1000
+
+    def __init__(self, parsers, chunk_size=None):
+        self.parsers = parsers
+        self.chunk_size = chunk_size or self.chunk_size
+
+    def get_path(self, query):
+        """
+        Tuple of tags or keys of schema query
+        """
+        raise NotImplementedError
+
+    def start(self, file_name, root):
+        raise NotImplementedError
+
+    def open_group(self, tag):
+        raise NotImplementedError
+
+    def close_group(self, tag):
+        raise NotImplementedError
+
+    def write_record(self, tag, items):
+        """
+        :param tag: record tag
+        :param items: list of (path, text) pairs
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        raise NotImplementedError
+
+    def abort(self, exc_info):
+        """
+        Close file after failure, document left incomplete
+        """
+        raise NotImplementedError
+
+    def export(self, file_name, root=None):
+        """
+        Document written into temporary file beside `file_name` and
+        renamed when complete, so readers never see partial document
+        """
+        groups = sorted(((self.get_path(parser.query), parser)
+                         for parser in self.parsers), key=itemgetter(0))
+
+        descriptor, temp_name = tempfile.mkstemp(
+            dir=os.path.dirname(file_name) or '.',
+            prefix=os.path.basename(file_name) + '.'
+        )
+        os.close(descriptor)
+        try:
+            # readable by others, like open() made it
+            os.chmod(temp_name, 0o644)
+            self.start(temp_name, root)
+            try:
+                self.write_groups(groups)
+            except Exception:
+                self.abort(sys.exc_info())
+                raise
+            self.finish()
+            os.rename(temp_name, file_name)
+        except Exception:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+            raise
+
+    def write_groups(self, groups):
+        """
+        :param groups: sorted list of (query path, model parser)
+        """
+        opened = ()
+        for path, parser in groups:
+            parents = path[:-1]
+            common = len(os.path.commonprefix([opened, parents]))
+            for tag in reversed(opened[common:]):
+                self.close_group(tag)
+            for tag in parents[common:]:
+                self.open_group(tag)
+            opened = parents
+
+            for instance, links in self.iter_instances(parser):
+                self.write_record(path[-1],
+                                  self.get_record(parser, instance, links))
+
+        for tag in reversed(opened):
+            self.close_group(tag)
+
+    def iter_instances(self, parser):
+        """
+        :return: iterator of (instance, through rows by m2m field)
+        """
+        manager = parser.model._default_manager.db_manager(
+            parser.read_using or parser.using
+        )
+        related = [field.name for field in parser.fields if field.rel_to]
+        plain_m2m = [field.name for field in parser.fields_m2m
+                     if not field.through_model]
+
+        queryset = manager.order_by('pk')
+        if related:
+            queryset = queryset.select_related(*related)
+        if plain_m2m:
+            queryset = queryset.prefetch_related(*plain_m2m)
+
+        last = None
+        while True:
+            chunk = queryset if last is None else queryset.filter(pk__gt=last)
+            chunk = list(chunk[:self.chunk_size])
+            if not chunk:
+                return
+
+            links = self.get_through_links(parser, chunk, manager.db)
+            for instance in chunk:
+                yield instance, links
+            last = chunk[-1].pk
+
+    @staticmethod
+    def get_through_links(parser, instances, using):
+        links = {}
+        for field in parser.fields_m2m:
+            if not field.through_model:
+                continue
+            attname = field.through_model._meta.get_field(
+                field.left_field
+            ).attname
+            rows = field.through_model._default_manager.using(using).filter(
+                **{'{}__in'.format(field.left_field): instances}
+            ).select_related(field.right_field).order_by('pk')
+
+            grouped = links[field] = {}
+            for row in rows:
+                grouped.setdefault(getattr(row, attname), []).append(row)
+        return links
+
+    def get_record(self, parser, instance, links):
+        items = []
+        for field in parser.fields:
+            value = field.export(getattr(instance, field.name))
+            if value is not None:
+                items.append((self.get_path(field.query), value))
+
+        for field in parser.fields_m2m:
+            path = self.get_path(field.query)
+            if not field.through_model:
+                for right in getattr(instance, field.name).all():
+                    items.append((path, field.export(right)))
+                continue
+
+            for row in links[field].get(instance.pk, ()):
+                items.append((path, field.export(getattr(row,
+                                                         field.right_field))))
+                for through_field in field.through_parsers:
+                    value = through_field.export(
+                        getattr(row, through_field.name)
+                    )
+                    if value is not None:
+                        items.append((self.get_path(through_field.query),
+                                      value))
+        return items
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+
+_missing = object()
+
+
+class LRUCache(object):
+    """
+    Thread safe mapping of last used `size` items
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.items[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            if len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class IOBoundHook(object):
+    """
+    Hook waiting on I/O, like lookup service or file backed
+    dictionary. Parsers call `map` with column of chunk: distinct
+    values missing in LRU cache resolved concurrently by bounded
+    thread pool, mapping continue after all of them done.
+
+    Any hook with true `io_bound` attribute and `map(values)` method
+    treated the same way, so hook may run values by own event loop.
+    """
+    io_bound = True
+
+    def __init__(self, func, workers=4, cache_size=10000):
+        self.func = func
+        self.workers = workers
+        self.cache = LRUCache(cache_size) if cache_size else None
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def __call__(self, value):
+        return self.map([value])[0]
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPool(self.workers)
+            return self.pool
+
+    def run(self, values):
+        if len(values) < 2 or self.workers < 2:
+            return map(self.func, values)
+        return self.get_pool().map(self.func, values)
+
+    def map(self, values):
+        """
+        :param values: raw values of column
+        :return: hook results in the same order
+        """
+        try:
+            distinct = OrderedDict.fromkeys(values)
+        except TypeError:
+            return self.run(values)
+
+        missing = []
+        for value in distinct:
+            if self.cache is not None:
+                distinct[value] = self.cache.get(value, _missing)
+            else:
+                distinct[value] = _missing
+            if distinct[value] is _missing:
+                missing.append(value)
+
+        for value, result in zip(missing, self.run(missing)):
+            distinct[value] = result
+            if self.cache is not None:
+                self.cache.set(value, result)
+        return [distinct[value] for value in values]
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
@@ -1,5 +1,98 @@
+from __future__ import absolute_import
+
+import json
+import re
+
 from mapper.utils.base import BaseMapperBackend
+from mapper.utils.export import BaseExporter
+
+
+class JsonExporter(BaseExporter):
+    """
+    Incremental writer: groups of schema query are nested objects,
+    records of one tag are written into one array item by item
+    """
+    # schema validated by xml backend before keep xpath queries
+    query_divider_re = re.compile(r'[./]')
+
+    def get_path(self, query):
+        return tuple(part for part in self.query_divider_re.split(query)
+                     if part)
+
+    def start(self, file_name, root):
+        self.file = open(file_name, 'wb')
+        self.levels = []
+        self.open_object()
+
+    def open_object(self):
+        self.file.write('{')
+        self.levels.append({'keys': 0, 'array': None, 'items': 0})
+
+    def write_key(self, key):
+        level = self.levels[-1]
+        self.close_array()
+        if level['keys']:
+            self.file.write(', ')
+        self.file.write(json.dumps(key) + ': ')
+        level['keys'] += 1
+
+    def close_array(self):
+        level = self.levels[-1]
+        if level['array'] is not None:
+            self.file.write(']')
+            level['array'] = None
+
+    def open_group(self, tag):
+        self.write_key(tag)
+        self.open_object()
+
+    def close_group(self, tag):
+        self.close_array()
+        self.file.write('}')
+        self.levels.pop()
+
+    def write_record(self, tag, items):
+        level = self.levels[-1]
+        if level['array'] != tag:
+            self.write_key(tag)
+            self.file.write('[')
+            level['array'] = tag
+            level['items'] = 0
+        if level['items']:
+            self.file.write(', ')
+        self.file.write(json.dumps(self.make_object(items)))
+        level['items'] += 1
+
+    @staticmethod
+    def make_object(items):
+        """
+        Nested dict of (path, text) pairs, repeated values become lists
+        """
+        record = {}
+        for path, value in items:
+            parent = record
+            for part in path[:-1]:
+                parent = parent.setdefault(part, {})
+            key = path[-1]
+            if key not in parent:
+                parent[key] = value
+            elif isinstance(parent[key], list):
+                parent[key].append(value)
+            else:
+                parent[key] = [parent[key], value]
+        return record
+
+    def finish(self):
+        while self.levels:
+            self.close_group(None)
+        self.file.close()
+        self.file = None
+
+    def abort(self, exc_info):
+        self.levels = []
+        self.file.close()
+        self.file = None
 
 
 class JsonMapperBackend(BaseMapperBackend):
-    pass
\ No newline at end of file
+    exporter_cls = JsonExporter
@@ -0,0 +1,50 @@
+INSERT = 'insert'
+UPDATE = 'update'
+UNCHANGED = 'unchanged'
+MISSING = 'missing'
+
+
+def merge_join(feed, table, compare):
+    """
+    Classify feed records against existing rows in one sequential pass.
+    Both streams must be sorted by key in the same order.
+    :param feed: iterable of (key, record) sorted by key
+    :param table: iterable of (key, row) sorted by key
+    :param compare: function(record, row), True if record equals row
+    :return: iterator of (status, key, record, row)
+    """
+    feed = iter(feed)
+    table = ordered(table)
+    feed_item = next(feed, None)
+    table_item = next(table, None)
+
+    while feed_item is not None or table_item is not None:
+        if table_item is None or (feed_item is not None and
+                                  feed_item[0] < table_item[0]):
+            yield INSERT, feed_item[0], feed_item[1], None
+            feed_item = next(feed, None)
+
+        elif feed_item is None or table_item[0] < feed_item[0]:
+            yield MISSING, table_item[0], None, table_item[1]
+            table_item = next(table, None)
+
+        else:
+            key, record = feed_item
+            row = table_item[1]
+            status = UNCHANGED if compare(record, row) else UPDATE
+            yield status, key, record, row
+
+            feed_item = next(feed, None)
+            # repeated feed key matched with the same row
+            if feed_item is None or feed_item[0] != key:
+                table_item = next(table, None)
+
+
+def ordered(table):
+    previous = None
+    for item in table:
+        if previous is not None and item[0] < previous:
+            raise ValueError('table rows not sorted by key as python does, '
+                             'database collation must be binary')
+        previous = item[0]
+        yield item
@@ -0,0 +1,129 @@
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .. import settings as mapper_settings
+
+_state = threading.local()
+
+
+class BulkSession(object):
+    """
+    Fast write settings of databases for the time of bulk load,
+    durability traded for speed. Original values read before load
+    and restored after it, also when load failed. Settings are per
+    connection: thread entered session and worker threads attached
+    to it get them, connections of other threads keep own settings.
+
+    SQLite: pragmas of `BULK_SESSION` setting. PostgreSQL: session
+    settings of `BULK_SESSION`, and constraints deferred when load
+    run inside transaction (outside of it every statement commits
+    and checks constraints anyway). Deferral is local to transaction,
+    so it is not restored, constraints checked on commit.
+    """
+
+    def __init__(self, aliases, options=None):
+        """
+        :param aliases: write database aliases of load
+        :param options: vendor -> ((name, fast value), ...)
+        """
+        self.aliases = set(aliases)
+        self.options = options or getattr(settings, 'MAPPER_BULK_SESSION',
+                                          mapper_settings.BULK_SESSION)
+        # alias -> [(name, original value)]
+        self.saved = {}
+
+    def __enter__(self):
+        try:
+            for alias in self.aliases:
+                # opened before receiver connected, so applied once
+                connection = connections[alias]
+                connection.ensure_connection()
+                self.saved[alias] = self.apply(connection)
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        connection_created.connect(self.on_connection_created)
+        self.attach()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.detach()
+        connection_created.disconnect(self.on_connection_created)
+        while self.saved:
+            alias, saved = self.saved.popitem()
+            self.restore(connections[alias], saved)
+
+    def attach(self):
+        """
+        Connections opened by current thread get session settings.
+        Worker threads attach themselves and close own connections
+        before finish, so settings never outlive session.
+        """
+        _state.session = self
+
+    def detach(self):
+        if getattr(_state, 'session', None) is self:
+            _state.session = None
+
+    def on_connection_created(self, sender, connection, **kwargs):
+        if (getattr(_state, 'session', None) is self and
+                connection.alias in self.aliases):
+            self.apply(connection)
+
+    def apply(self, connection):
+        """
+        :return: original values of changed settings
+        """
+        apply = getattr(self, 'apply_{}'.format(connection.vendor), None)
+        if apply is None:
+            return []
+        with connection.cursor() as cursor:
+            return apply(connection, cursor,
+                         self.options.get(connection.vendor, ()))
+
+    def restore(self, connection, saved):
+        restore = getattr(self, 'restore_{}'.format(connection.vendor),
+                          None)
+        if restore is None or not saved:
+            return
+        if connection.needs_rollback:
+            # load failed inside atomic block, connection refuses queries
+            # until rollback; settings were set inside that transaction
+            # (SQLite not allows it), so rolled back with it
+            return
+        with connection.cursor() as cursor:
+            restore(cursor, saved)
+
+    @staticmethod
+    def apply_sqlite(connection, cursor, options):
+        saved = []
+        for name, value in options:
+            cursor.execute('PRAGMA {}'.format(name))
+            saved.append((name, cursor.fetchone()[0]))
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        return saved
+
+    @staticmethod
+    def restore_sqlite(cursor, saved):
+        for name, value in reversed(saved):
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+    @staticmethod
+    def apply_postgresql(connection, cursor, options):
+        saved = []
+        for name, value in options:
+            cursor.execute('SHOW {}'.format(name))
+            saved.append((name, cursor.fetchone()[0]))
+            cursor.execute('SET {} TO %s'.format(name), [value])
+        if connection.in_atomic_block:
+            # ends with transaction of caller
+            cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+        return saved
+
+    @staticmethod
+    def restore_postgresql(cursor, saved):
+        for name, value in reversed(saved):
+            cursor.execute('SET {} TO %s'.format(name), [value])
@@ -0,0 +1,161 @@
+import cPickle as pickle
+import heapq
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import defaultdict
+from itertools import count
+
+
+def _write_run(items, directory):
+    run = tempfile.TemporaryFile(dir=directory)
+    for item in items:
+        pickle.dump(item, run, pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    load = pickle.Unpickler(run).load
+    while True:
+        try:
+            yield load()
+        except EOFError:
+            return
+
+
+def external_sort(items, key, max_items=100000, directory=None):
+    """
+    Sort items which may not fit in memory. Sorted runs of
+    `max_items` spilled to temporary files and merged back lazily.
+    :param items: iterable of picklable items
+    :param key: function of sort key
+    :param max_items: items kept in memory before spill
+    :param directory: directory of temporary files
+    """
+    sequence = count()
+    runs = []
+    chunk = []
+    try:
+        for item in items:
+            # sequence keeps sort stable and items never compared
+            chunk.append((key(item), next(sequence), item))
+            if len(chunk) >= max_items:
+                chunk.sort()
+                runs.append(_write_run(chunk, directory))
+                chunk = []
+        chunk.sort()
+
+        if not runs:
+            for _, _, item in chunk:
+                yield item
+            return
+
+        streams = [_read_run(run) for run in runs]
+        streams.append(iter(chunk))
+        for _, _, item in heapq.merge(*streams):
+            yield item
+    finally:
+        for run in runs:
+            run.close()
+
+
+class SpillStore(object):
+    """
+    Append only channels of picklable items. Items kept in memory
+    pickled until `max_memory` bytes, then all of them spilled to
+    temporary sqlite file. Channels read back sequentially in chunks
+    in the order of appending.
+    """
+
+    def __init__(self, max_memory, directory=None):
+        self.max_memory = max_memory
+        self.directory = directory
+        self.buffers = defaultdict(list)
+        self.memory = 0
+        self.spilled = 0
+        self.file_name = None
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def append(self, channel, item):
+        data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.buffers[channel].append(data)
+            self.memory += len(data)
+            if self.memory > self.max_memory:
+                self.spill()
+
+    def open(self):
+        handle, self.file_name = tempfile.mkstemp(suffix='.sqlite',
+                                                  dir=self.directory)
+        os.close(handle)
+        # read by worker threads of stages, access serialized by lock
+        self.connection = sqlite3.connect(self.file_name,
+                                          check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('CREATE TABLE items '
+                                '(id INTEGER PRIMARY KEY, channel TEXT, '
+                                'data BLOB)')
+        self.connection.execute('CREATE INDEX items_channel '
+                                'ON items (channel, id)')
+
+    def spill(self):
+        if self.connection is None:
+            self.open()
+
+        with self.connection:
+            for channel, buffer in self.buffers.items():
+                self.connection.executemany(
+                    'INSERT INTO items (channel, data) VALUES (?, ?)',
+                    ((channel, sqlite3.Binary(data)) for data in buffer)
+                )
+                self.spilled += len(buffer)
+        self.buffers.clear()
+        self.memory = 0
+
+    def iter_chunks(self, channel, size):
+        """
+        :param channel: channel name
+        :param size: items in chunk
+        :return: iterator of item lists
+        """
+        last = 0
+        while self.connection is not None:
+            with self.lock:
+                rows = self.connection.execute(
+                    'SELECT id, data FROM items WHERE channel = ? AND id > ? '
+                    'ORDER BY id LIMIT ?', (channel, last, size)
+                ).fetchall()
+            if not rows:
+                break
+            last = rows[-1][0]
+            yield [pickle.loads(str(data)) for _, data in rows]
+
+        buffer = self.buffers.get(channel, ())
+        for start in xrange(0, len(buffer), size):
+            yield [pickle.loads(data) for data in buffer[start:start + size]]
+
+    def iter_items(self, channel, size=1000):
+        """
+        Items of channel one by one, read in chunks of `size`
+        """
+        for chunk in self.iter_chunks(channel, size):
+            for item in chunk:
+                yield item
+
+    def close(self):
+        self.buffers.clear()
+        self.memory = 0
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            os.remove(self.file_name)
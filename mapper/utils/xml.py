@@ -1,3 +1,9 @@
+import mmap
+import os
+import re
+import tempfile
+from collections import defaultdict, namedtuple
+
 from lxml import etree
 
 from ..utils.base import BaseModelParser
@@ -6,10 +12,12 @@ from ..utils.base import BaseMapperBackend
 from ..utils.base import BaseFieldValidator
 from ..utils.base import BaseManyToManyValidator
 from ..utils.base import BaseManyToManyParseField
+from ..utils.export import BaseExporter
 
 
 class XmlHelper(object):
     query_divider = '.'
+    tag_path_re = re.compile(r'^\.//([\w\-]+(?:/[\w\-]+)*)$')
 
     @classmethod
     def get_relative_xpath(cls, query):
@@ -27,6 +35,220 @@ class XmlHelper(object):
             )
         return query
 
+    @classmethod
+    def get_tag_path(cls, query):
+        """
+        Tuple of tags for plain relative query, like './/channel/events'.
+        None returned for queries with predicates, wildcards and etc.
+        """
+        match = cls.tag_path_re.match(query)
+        if match is None:
+            return None
+        return tuple(match.group(1).split('/'))
+
+
+Shard = namedtuple('Shard', ('number', 'start', 'end', 'count'))
+
+
+class XmlShardIndex(object):
+    """
+    Byte offsets of record elements for one plain query path.
+    Built by single scan of raw file and stored in sidecar file
+    `<file_name>.idx`, so every worker of fleet share it.
+
+    .. note: namespaces, DTD entities and nested records of same
+        path are not supported
+    """
+    suffix = '.idx'
+    header = '# mapper shard index'
+    token_re = re.compile(
+        r'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<[?!][^>]*>|'
+        r'<(/?)([^\s/>]+)(?:[^>"\']|"[^"]*"|\'[^\']*\')*?(/?)>',
+        re.S
+    )
+    declaration_re = re.compile(r'^\s*(<\?xml[^>]*\?>)')
+
+    def __init__(self, file_name, path, records, size=None, mtime=None):
+        self.file_name = file_name
+        self.path = tuple(path)
+        self.records = records
+        self.size = size
+        self.mtime = mtime
+
+    @classmethod
+    def get_index_name(cls, file_name):
+        return file_name + cls.suffix
+
+    @classmethod
+    def get_path(cls, query):
+        path = XmlHelper.get_tag_path(
+            XmlHelper.get_relative_xpath(query)
+        )
+        if path is None:
+            raise ValueError('{query} is not plain tag path, '
+                             'sharding not supported'.format(query=query))
+        return path
+
+    @classmethod
+    def build(cls, file_name, query):
+        """
+        :param file_name: full path of xml file
+        :param query: record query of model, like 'channel.events.event'
+        """
+        path = cls.get_path(query)
+        depth = len(path)
+        records = []
+        stack = []
+        record_start = record_depth = None
+
+        stat = os.stat(file_name)
+        with open(file_name, 'rb') as source:
+            if not stat.st_size:
+                return cls(file_name, path, records, 0, stat.st_mtime)
+            data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for match in cls.token_re.finditer(data):
+                    closing, tag, empty = match.groups()
+                    if tag is None:
+                        continue
+
+                    if closing:
+                        stack.pop()
+                        if len(stack) == record_depth:
+                            records.append((record_start, match.end()))
+                            record_start = record_depth = None
+                        continue
+
+                    stack.append(tag)
+                    if (record_depth is None and len(stack) > depth and
+                            tuple(stack[-depth:]) == path):
+                        record_start = match.start()
+                        record_depth = len(stack) - 1
+                    if empty:
+                        stack.pop()
+                        if len(stack) == record_depth:
+                            records.append((record_start, match.end()))
+                            record_start = record_depth = None
+            finally:
+                data.close()
+
+        return cls(file_name, path, records, stat.st_size, stat.st_mtime)
+
+    def save(self):
+        """
+        Write index into temporary file and rename it, so workers
+        loading concurrently never read partial index
+        """
+        index_name = self.get_index_name(self.file_name)
+        descriptor, temp_name = tempfile.mkstemp(
+            dir=os.path.dirname(index_name) or '.',
+            prefix=os.path.basename(index_name) + '.'
+        )
+        try:
+            # readable by workers of other users, like open() made it
+            os.chmod(temp_name, 0o644)
+            with os.fdopen(descriptor, 'w') as index:
+                index.write('{header}\npath {path}\nsize {size}\n'
+                            'mtime {mtime!r}\ncount {count}\n'.format(
+                                header=self.header,
+                                path='/'.join(self.path),
+                                size=self.size,
+                                mtime=self.mtime,
+                                count=len(self.records)))
+                for start, end in self.records:
+                    index.write('{} {}\n'.format(start, end))
+            os.rename(temp_name, index_name)
+        except Exception:
+            os.remove(temp_name)
+            raise
+
+    @classmethod
+    def read(cls, file_name):
+        with open(cls.get_index_name(file_name)) as index:
+            if index.readline().rstrip('\n') != cls.header:
+                raise ValueError('{} is not shard index'.format(index.name))
+            meta = dict(index.readline().rstrip('\n').split(' ', 1)
+                        for _ in range(4))
+            records = [tuple(map(int, line.split())) for line in index]
+        if len(records) != int(meta['count']):
+            raise ValueError('{} is truncated'.format(
+                cls.get_index_name(file_name)
+            ))
+        return cls(file_name, meta['path'].split('/'), records,
+                   int(meta['size']), float(meta['mtime']))
+
+    @classmethod
+    def load(cls, file_name, query):
+        """
+        Read sidecar index, rebuild it when missing or stale
+        """
+        path = cls.get_path(query)
+        stat = os.stat(file_name)
+        try:
+            index = cls.read(file_name)
+        except (IOError, ValueError, KeyError):
+            index = None
+
+        if (index is None or index.path != path or
+                index.size != stat.st_size or index.mtime != stat.st_mtime):
+            index = cls.build(file_name, query)
+            index.save()
+        return index
+
+    def get_shards(self, count):
+        """
+        Split records into `count` contiguous shards balanced by bytes
+        """
+        if count < 1:
+            raise ValueError('shards count must be positive')
+
+        total = sum(end - start for start, end in self.records)
+        shards = []
+        first = 0
+        consumed = 0
+        for number in range(count):
+            if number == count - 1:
+                last = len(self.records)
+            else:
+                target = total * (number + 1) / float(count)
+                last = first
+                while (last < len(self.records) and
+                       consumed < target):
+                    start, end = self.records[last]
+                    consumed += end - start
+                    last += 1
+
+            if last > first:
+                shards.append(Shard(number, self.records[first][0],
+                                    self.records[last - 1][1], last - first))
+            else:
+                shards.append(Shard(number, None, None, 0))
+            first = last
+        return shards
+
+    def get_records(self, shard):
+        return [(start, end) for start, end in self.records
+                if start >= shard.start and end <= shard.end]
+
+    def read_shard(self, shard):
+        """
+        Well formed document of shard records wrapped into tags of path
+        """
+        with open(self.file_name, 'rb') as source:
+            head = source.read(256)
+            source.seek(shard.start)
+            data = source.read(shard.end - shard.start)
+
+        declaration = self.declaration_re.match(head)
+        parents = self.path[:-1]
+        parts = [declaration.group(1) if declaration else '', '<shard>']
+        parts.extend('<{}>'.format(tag) for tag in parents)
+        parts.extend(data[start - shard.start:end - shard.start]
+                     for start, end in self.get_records(shard))
+        parts.extend('</{}>'.format(tag) for tag in reversed(parents))
+        parts.append('</shard>')
+        return ''.join(parts)
+
 
 class XmlFieldValidator(BaseFieldValidator):
 
@@ -42,24 +264,26 @@ class XmlManyToManyValidator(BaseManyToManyValidator):
 
 
 class XmlFieldParser(BaseFieldParser):
+    __slots__ = ()
     validator = XmlFieldValidator
 
     @classmethod
     def get_raw_value(cls, raw_data, query):
-        return map(lambda x: x.text, raw_data.findall(query))
+        return [item.text for item in raw_data.findall(query)]
 
 
 class XmlManyToManyFieldParser(BaseManyToManyParseField):
-
+    __slots__ = ()
     validator = XmlManyToManyValidator
     field_parser_cls = XmlFieldParser
 
     @classmethod
     def get_raw_value(cls, raw_data, query):
-        return map(lambda x: x.text, raw_data.findall(query))
+        return [item.text for item in raw_data.findall(query)]
 
 
 class XmlModelParser(BaseModelParser):
+    __slots__ = ()
     field_parser_cls = XmlFieldParser
     field_parser_m2m_cls = XmlManyToManyFieldParser
 
@@ -74,8 +298,221 @@ class XmlModelParser(BaseModelParser):
             yield raw_item
 
 
+class XmlExporter(BaseExporter):
+    """
+    Incremental writer, every record built as small element and
+    written at once, so document never kept in memory
+    """
+    encoding = 'utf-8'
+    default_root = 'root'
+
+    def get_path(self, query):
+        path = XmlHelper.get_tag_path(XmlHelper.get_relative_xpath(query))
+        if path is None:
+            raise ValueError('query {query} can not be exported'.format(
+                query=query
+            ))
+        return path
+
+    def start(self, file_name, root):
+        self.file = etree.xmlfile(file_name, encoding=self.encoding)
+        self.writer = self.file.__enter__()
+        self.writer.write_declaration()
+        self.contexts = []
+        self.open_group(root or self.default_root)
+
+    def open_group(self, tag):
+        context = self.writer.element(tag)
+        context.__enter__()
+        self.contexts.append(context)
+
+    def close_group(self, tag):
+        self.contexts.pop().__exit__(None, None, None)
+
+    def write_record(self, tag, items):
+        record = etree.Element(tag)
+        for path, value in items:
+            parent = record
+            for part in path[:-1]:
+                child = parent.find(part)
+                if child is None:
+                    child = etree.SubElement(parent, part)
+                parent = child
+            etree.SubElement(parent, path[-1]).text = value
+        self.writer.write(record)
+
+    def finish(self):
+        while self.contexts:
+            self.close_group(None)
+        self.file.__exit__(None, None, None)
+        self.file = self.writer = None
+
+    def abort(self, exc_info):
+        # xmlfile closes file without end tags on error
+        self.contexts = []
+        self.file.__exit__(*exc_info)
+        self.file = self.writer = None
+
+
 class XmlMapperBackend(BaseMapperBackend):
     parser_cls = XmlModelParser
+    exporter_cls = XmlExporter
 
     def load_source(self, file_name):
-        return etree.parse(file_name)
\ No newline at end of file
+        return etree.parse(file_name)
+
+    def load_shard(self, file_name, options, shard, query, workers=None,
+                   using=None, read_using=None, bulk_signals=None,
+                   bulk_session=None):
+        """
+        Map records of one shard only, shards loaded independently
+        and reloading of shard is idempotent.
+        :param shard: one of `XmlShardIndex.get_shards` result
+        :type shard: Shard
+        :param query: record query which index built for
+        :raise ValueError: schema contain models outside of sharded
+            records, load them by `load` with schema of them only
+        """
+        self.check_shard_parsers(self.load_parsers(options),
+                                 XmlShardIndex.get_path(query))
+        if not shard.count:
+            return
+
+        index = XmlShardIndex.load(file_name, query)
+        self.prepare(options, workers, using, read_using, bulk_signals,
+                     bulk_session)
+        self.source = etree.ElementTree(
+            etree.fromstring(index.read_shard(shard))
+        )
+        try:
+            self.run_session(self.source)
+        finally:
+            self.source = None
+
+    @staticmethod
+    def check_shard_parsers(parsers, path):
+        """
+        Shard holds only records of path with parent tags, so every
+        model query must start by tail of path
+        """
+        outside = []
+        for parser in parsers:
+            query = XmlHelper.get_tag_path(parser.query)
+            if query is None or not any(
+                    query[:size] == path[-size:]
+                    for size in range(1, len(path) + 1)):
+                outside.append(parser.label)
+        if outside:
+            raise ValueError('{models} not found in shards of {path}, '
+                             'load them without sharding'.format(
+                                 models=', '.join(sorted(outside)),
+                                 path='/'.join(path)))
+
+    @staticmethod
+    def get_shards(file_name, query, count):
+        """
+        :param query: record query of model, for example
+            'channel.events.event'
+        :param count: number of shards
+        """
+        return XmlShardIndex.load(file_name, query).get_shards(count)
+
+    def iter_preview_records(self, file_name, parsers):
+        """
+        Stream document by iterparse, records of plain tag path
+        queries cleared after mapping, so reading can stop early.
+        Parsers of other queries need whole document.
+        """
+        dispatch = defaultdict(list)
+        fallback = []
+        for parser in parsers:
+            path = XmlHelper.get_tag_path(parser.query)
+            if path is None:
+                fallback.append(parser)
+            else:
+                dispatch[path].append(parser)
+
+        if dispatch:
+            with open(file_name, 'rb') as source:
+                for record in self.stream_records(source, dispatch):
+                    yield record
+
+        if fallback:
+            records = super(XmlMapperBackend, self).iter_preview_records(
+                file_name, fallback
+            )
+            for record in records:
+                yield record
+
+    @staticmethod
+    def stream_records(source, dispatch):
+        """
+        :param dispatch: tag path -> parsers
+        """
+        stack = []
+        # claimed parsers of every open element
+        claims = []
+        open_records = 0
+        for event, element in etree.iterparse(source,
+                                              events=('start', 'end')):
+            if event == 'start':
+                stack.append(element.tag)
+                claimed = []
+                for path, path_parsers in dispatch.items():
+                    if (len(stack) > len(path) and
+                            tuple(stack[-len(path):]) == path):
+                        claimed.extend(path_parsers)
+                claims.append(claimed)
+                open_records += bool(claimed)
+                continue
+
+            stack.pop()
+            claimed = claims.pop()
+            if claimed:
+                open_records -= 1
+                yield element, claimed
+            if open_records:
+                # part of enclosing record, mapped with it
+                continue
+
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    def iter_records(self, source, parsers):
+        """
+        Walk document once for all parsers with plain tag path query,
+        every record element dispatch to all parsers claimed it by path
+        """
+        dispatch = defaultdict(lambda: defaultdict(list))
+        fallback = []
+        for parser in parsers:
+            path = XmlHelper.get_tag_path(parser.query)
+            if path is None:
+                fallback.append(parser)
+            else:
+                dispatch[path[-1]][path].append(parser)
+
+        if dispatch:
+            root = source.getroot() if hasattr(source, 'getroot') else source
+            stack = []
+            for event, element in etree.iterwalk(root,
+                                                 events=('start', 'end')):
+                if event == 'end':
+                    stack.pop()
+                    continue
+
+                stack.append(element.tag)
+                paths = dispatch.get(element.tag)
+                if not paths:
+                    continue
+
+                for path, claimed in paths.items():
+                    # query is relative, root element itself never matched
+                    if (len(stack) > len(path) and
+                            tuple(stack[-len(path):]) == path):
+                        yield element, claimed
+
+        for raw_data, claimed in super(XmlMapperBackend, self).iter_records(
+                source, fallback):
+            yield raw_data, claimed
\ No newline at end of file